@@ -0,0 +1,96 @@
+"""Per-user access entitlements: enrolled courses, registered and paid events.
+
+``for_user`` loads the three id sets with one query each and caches them
+under a per-user key, so access checks on a warm cache touch no table.
+``accounts.signals`` drops the key whenever an ``Enrollment``,
+``Participant`` or ``Payment`` row of the user is written or deleted (again
+on commit, so a read racing the transaction cannot re-cache stale sets).
+
+Invalidation only reaches other workers through a shared cache, so with a
+process-local backend (``LocMemCache``) the sets are not cached. Views and
+serializers go through ``for_request``, which loads them at most once per
+request either way. They only answer read checks: paid paths (enrolling,
+registering) check the table before charging.
+"""
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+
+
+class Entitlements(NamedTuple):
+    courses: frozenset  # enrolled course ids
+    events: frozenset  # registered event ids
+    paid_events: frozenset  # event ids with a succeeded payment
+
+    def has_course(self, course_id):
+        return course_id in self.courses
+
+    def has_event(self, event_id):
+        return event_id in self.events
+
+    def can_stream(self, event):
+        """Registered, and paid unless the event is free."""
+        return event.pk in self.events and (event.final_price <= 0 or event.pk in self.paid_events)
+
+
+# Backends whose entries are private to one process.
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def _cache_key(user_id):
+    return f'entitlements:{user_id}'
+
+
+def load(user_id):
+    from coaching.models import Event, Participant
+    from course.models import Enrollment
+    from payments.models import Payment
+
+    return Entitlements(
+        courses=frozenset(Enrollment.objects.filter(user_id=user_id).values_list('course_id', flat=True)),
+        events=frozenset(Participant.objects.filter(user_id=user_id).values_list('event_id', flat=True)),
+        paid_events=frozenset(
+            Payment.objects.filter(
+                user_id=user_id,
+                content_type=ContentType.objects.get_for_model(Event),
+                status='succeeded',
+            ).values_list('object_id', flat=True)
+        ),
+    )
+
+
+def for_user(user):
+    """Cached ``Entitlements`` for ``user`` (a user or a user id)."""
+    user_id = getattr(user, 'pk', user)
+    if not cache_is_shared():
+        return load(user_id)
+    key = _cache_key(user_id)
+    entitlements = cache.get(key)
+    if entitlements is None:
+        entitlements = load(user_id)
+        cache.set(key, entitlements, settings.ENTITLEMENTS_CACHE_TIMEOUT)
+    return entitlements
+
+
+def for_request(request):
+    """``for_user(request.user)``, loaded once per request."""
+    entitlements = getattr(request, '_entitlements', None)
+    if entitlements is None:
+        entitlements = request._entitlements = for_user(request.user)
+    return entitlements
+
+
+def invalidate(user_id):
+    key = _cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
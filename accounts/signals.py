@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+
+from coaching.models import Participant
+from course.models import Enrollment
+from payments.models import Payment
+
+from . import entitlements
+
+
+def entitlement_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        entitlements.invalidate(instance.user_id)
+
+
+for model in (Enrollment, Participant, Payment):
+    post_save.connect(entitlement_changed, sender=model, dispatch_uid=f'entitlements_{model.__name__}_saved')
+    post_delete.connect(entitlement_changed, sender=model, dispatch_uid=f'entitlements_{model.__name__}_deleted')
@@ -1,8 +1,17 @@
-from django.test import TestCase
+import tempfile
+
+from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from rest_framework.test import APITestCase
 from rest_framework import status
 
+from coaching.models import Event
+from course.models import Course, Enrollment
+
+from . import entitlements
+
 User = get_user_model()
 
 class UserTests(APITestCase):
@@ -30,3 +39,36 @@ class UserTests(APITestCase):
         response = self.client.post('/api/v1/auth/jwt/create/', data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('access', response.data)
+
+class EntitlementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ContentType.objects.get_for_model(Event)
+        self.user = User.objects.create_user(email='learner@example.com', password='testpass123')
+        instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.course = Course.objects.create(title='Course', instructor=instructor, final_price=100)
+
+    def test_loaded_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(3):
+            entitlements.for_request(request)
+            self.assertFalse(entitlements.for_request(request).has_course(self.course.pk))
+
+    def test_shared_cache_and_invalidation(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            self.assertTrue(entitlements.cache_is_shared())
+            with self.assertNumQueries(3):
+                entitlements.for_user(self.user)
+            with self.assertNumQueries(0):
+                self.assertFalse(entitlements.for_user(self.user).has_course(self.course.pk))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                enrollment = Enrollment.objects.create(user=self.user, course=self.course)
+            self.assertTrue(entitlements.for_user(self.user).has_course(self.course.pk))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                enrollment.delete()
+            self.assertFalse(entitlements.for_user(self.user).has_course(self.course.pk))
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import Event, Participant, Speaker, Schedule
 from payments.serializers import PaymentSerializer
-from payments.models import Payment
+from accounts import entitlements
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -81,16 +81,6 @@ class EventSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return None
-        is_participant = Participant.objects.filter(session=obj, user=request.user).exists()
-        if not is_participant:
+        if not entitlements.for_request(request).can_stream(obj):
             return None
-        if obj.final_price > 0:
-            has_paid = Payment.objects.filter(
-                user=request.user,
-                content_type__model='event',
-                object_id=obj.id,
-                status='succeeded'
-            ).exists()
-            if not has_paid:
-                return None
         return obj.stream_url
\ No newline at end of file
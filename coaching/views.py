@@ -1,16 +1,14 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
-from django.conf import settings
 from django.utils import timezone
-from django.contrib.contenttypes.models import ContentType
 import requests
-import uuid
 import logging
-import time
 
 from devangwa.request_utils import get_bearer_token
+from payments import services as payments
 
 from .models import Event, Participant, Speaker, Schedule
 from .serializers import EventSerializer, ParticipantSerializer, SpeakerSerializer, ScheduleSerializer
@@ -25,33 +23,6 @@ class EventViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
-    def process_payment(self, content_type_id, object_id, amount, payment_method, phone_number, card_number, auth_token):
-        max_attempts = 3
-        attempt = 1
-        while attempt <= max_attempts:
-            try:
-                response = requests.post(
-                    f"{settings.PAYMENTS_API_BASE_URL}/checkout/",
-                    json={
-                        'content_type_id': content_type_id,
-                        'object_id': object_id,
-                        'amount': float(amount),
-                        'payment_method': payment_method,
-                        'phone_number': phone_number,
-                        'card_number': card_number,
-                        'idempotency_key': str(uuid.uuid4())
-                    },
-                    headers={'Authorization': f'Bearer {auth_token}'}
-                )
-                response.raise_for_status()
-                return response.json()
-            except requests.RequestException as e:
-                logger.error(f"Payment attempt {attempt}/{max_attempts} failed: {str(e)}")
-                if attempt == max_attempts:
-                    raise
-                attempt += 1
-                time.sleep(1)  # Wait 1 second before retrying
-
     @action(detail=True, methods=['POST'], permission_classes=[IsAuthenticated])
     def attend(self, request, slug=None):
         event = self.get_object()
@@ -60,6 +31,8 @@ class EventViewSet(viewsets.ModelViewSet):
         if event.registration_deadline < timezone.now():
             return Response({'detail': 'Registration deadline has expired'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Checked against the table, not the entitlements cache: a stale
+        # answer here would charge the user twice.
         if Participant.objects.filter(event=event, user=user).exists():
             return Response({'detail': 'You are already registered for this event'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -72,28 +45,31 @@ class EventViewSet(viewsets.ModelViewSet):
         phone_number = request.data.get('phone_number')
         card_number = request.data.get('card_number')
 
-        auth_token = get_bearer_token(request)
-        if not auth_token:
-            return Response({'detail': 'Authentication required for paid registration.'}, status=status.HTTP_401_UNAUTHORIZED)
-
         try:
-            content_type = ContentType.objects.get_for_model(Event)
-            payment_response = self.process_payment(
-                content_type_id=content_type.id,
-                object_id=event.id,
-                amount=event.final_price,
+            payment_response = payments.pay(
+                user, event, event.final_price,
                 payment_method=payment_method,
                 phone_number=phone_number,
                 card_number=card_number,
-                auth_token=auth_token,
+                auth_token=get_bearer_token(request),
             )
 
             if payment_response['status'] == 'succeeded':
-                participant = Participant.objects.create(event=event, user=user)
+                # The payment already granted access when it succeeded.
+                participant, _ = Participant.objects.get_or_create(event=event, user=user)
                 serializer = ParticipantSerializer(participant)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
+            elif payment_response['status'] == 'pending':
+                # Still being charged; the registration is created when it succeeds.
+                return Response({
+                    'detail': 'Payment is being processed.',
+                    'order_tracking_id': payment_response['order_tracking_id'],
+                    'status': 'pending',
+                }, status=status.HTTP_202_ACCEPTED)
             else:
-                return Response({'detail': payment_response.get('error', 'Payment failed')}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({'detail': payment_response.get('details', 'Payment failed')}, status=status.HTTP_400_BAD_REQUEST)
+        except APIException:
+            raise
         except requests.RequestException as e:
             return Response({'detail': f'Payment service error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
@@ -0,0 +1,156 @@
+"""Denormalized content, enrollment and rating counters stored on ``Course``
+(plus its ``content_version`` stamp) and content totals stored on ``Module``.
+
+Counters are only ever changed with ``F()`` expressions, and only when rows are
+created or deleted, so concurrent writers never overwrite each other. Signal
+receivers in ``course.signals`` keep them current for single-row writes and
+for queryset deletes (which send ``post_delete`` per row). ``bulk_create``
+sends no signals: callers either set the totals themselves or pass the new
+rows to ``count_created_content``. ``counter_drift`` finds rows that went
+out of sync anyway.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Course, CourseReview, Document, Enrollment, Module, Quiz, Video
+from .progress import refresh_completion
+
+# Content counted on both the module and its course, keyed by model.
+CONTENT_COUNTERS = {
+    Video: 'total_videos',
+    Document: 'total_documents',
+    Quiz: 'total_quizzes',
+}
+
+
+def _adjust(model, deltas, lookup):
+    updates = {}
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        expression = F(name) + delta
+        updates[name] = expression if delta > 0 else Greatest(expression, Value(0))
+    if updates:
+        model.objects.filter(**lookup).update(**updates)
+
+
+def adjust_course_counters(deltas, **lookup):
+    """Add ``deltas`` (counter name -> int) to every course matching ``lookup``."""
+    _adjust(Course, deltas, lookup)
+
+
+def adjust_module_counters(deltas, **lookup):
+    """Add ``deltas`` (counter name -> int) to every module matching ``lookup``."""
+    _adjust(Module, deltas, lookup)
+
+
+def count_created_content(model, instances):
+    """Count videos, documents or quizzes inserted with ``bulk_create``.
+
+    Each affected module and course is updated once, whatever the number of
+    rows, by adding the per-parent count of the new rows to its counter.
+    """
+    pks = [instance.pk for instance in instances]
+    if not pks:
+        return
+    name = CONTENT_COUNTERS[model]
+    module_ids = {instance.module_id for instance in instances}
+    Module.objects.filter(pk__in=module_ids).update(
+        **{name: F(name) + _subcount(model, 'module', pk__in=pks)}
+    )
+    Course.objects.filter(modules__in=module_ids).update(**{
+        name: F(name) + _subcount(model, 'module__course', pk__in=pks),
+        'content_version': F('content_version') + 1,
+    })
+    refresh_completion(module_ids)
+
+
+def review_contribution(visible, rating):
+    """Rating counter values contributed by a single review."""
+    if not visible:
+        return {}
+    contribution = {'rating_count': 1, 'rating_sum': rating}
+    if 1 <= rating <= 5:
+        contribution[f'rating_{rating}'] = 1
+    return contribution
+
+
+def apply_review_change(old_state, new_state):
+    """Move a review's contribution from ``old_state`` to ``new_state``.
+
+    States are ``(course_id, visible, rating)`` tuples, or None when the review
+    did not exist before (or no longer exists).
+    """
+    deltas = {}
+    if old_state is not None:
+        course_id, visible, rating = old_state
+        for name, value in review_contribution(visible, rating).items():
+            deltas.setdefault(course_id, Counter())[name] -= value
+    if new_state is not None:
+        course_id, visible, rating = new_state
+        for name, value in review_contribution(visible, rating).items():
+            deltas.setdefault(course_id, Counter())[name] += value
+    for course_id, course_deltas in deltas.items():
+        adjust_course_counters(course_deltas, pk=course_id)
+
+
+def _subtotal(model, parent_path, aggregate, **filters):
+    """``aggregate`` over ``model`` rows per outer parent row, 0 when none."""
+    values = model.objects.filter(**{parent_path: OuterRef('pk')}, **filters).order_by().values(
+        parent_path
+    ).annotate(total=aggregate).values('total')
+    return Coalesce(Subquery(values, output_field=IntegerField()), Value(0))
+
+
+def _subcount(model, parent_path, **filters):
+    return _subtotal(model, parent_path, Count('pk'), **filters)
+
+
+def counter_expressions():
+    """Expressions computing each course counter from scratch, keyed by field name."""
+    return {
+        'total_modules': _subcount(Module, 'course'),
+        'total_videos': _subcount(Video, 'module__course'),
+        'total_documents': _subcount(Document, 'module__course'),
+        'total_quizzes': _subcount(Quiz, 'module__course'),
+        'total_students': _subcount(Enrollment, 'course'),
+        'rating_count': _subcount(CourseReview, 'course', visible=True),
+        'rating_sum': _subtotal(CourseReview, 'course', Sum('rating'), visible=True),
+        **{
+            f'rating_{stars}': _subcount(CourseReview, 'course', visible=True, rating=stars)
+            for stars in range(1, 6)
+        },
+    }
+
+
+def module_counter_expressions():
+    """Expressions computing each module total from scratch, keyed by field name."""
+    return {name: _subcount(model, 'module') for model, name in CONTENT_COUNTERS.items()}
+
+
+def reconcile_course_counters(queryset=None):
+    """Recompute all counters in a single UPDATE; returns the number of courses."""
+    if queryset is None:
+        queryset = Course.objects.all()
+    return queryset.update(**counter_expressions())
+
+
+def reconcile_module_counters(queryset=None):
+    """Recompute module totals in a single UPDATE; returns the number of modules."""
+    if queryset is None:
+        queryset = Module.objects.all()
+    return queryset.update(**module_counter_expressions())
+
+
+def counter_drift(queryset, expressions):
+    """Rows of ``queryset`` whose stored counters differ from ``expressions``.
+
+    Each row is annotated with ``expected_<name>`` for every counter.
+    """
+    queryset = queryset.annotate(**{f'expected_{name}': expression for name, expression in expressions.items()})
+    drifted = Q()
+    for name in expressions:
+        drifted |= ~Q(**{name: F(f'expected_{name}')})
+    return queryset.filter(drifted)
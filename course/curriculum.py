@@ -0,0 +1,71 @@
+"""Bulk import of a course curriculum tree.
+
+``import_curriculum`` takes modules as validated by ``CurriculumSerializer``
+and inserts each level of the tree (modules, videos, documents, quizzes,
+questions, answers) with a single ``bulk_create`` inside one transaction.
+``bulk_create`` sends no signals, so module totals are set on insert and the
+course counters and ``content_version`` are adjusted once at the end.
+"""
+from django.db import transaction
+
+from .counters import adjust_course_counters
+from .models import Answer, Document, Module, Question, Quiz, Video
+from .progress import refresh_completion
+
+
+def import_curriculum(course, modules_data):
+    """Append ``modules_data`` to ``course``; returns ``(modules, counts)``."""
+    with transaction.atomic():
+        modules = Module.objects.bulk_create([
+            Module(
+                course=course,
+                title=data['title'],
+                order=data.get('order', 0),
+                total_videos=len(data.get('videos', ())),
+                total_documents=len(data.get('documents', ())),
+                total_quizzes=len(data.get('quizzes', ())),
+            )
+            for data in modules_data
+        ])
+
+        videos, documents, quizzes, quiz_questions = [], [], [], []
+        for module, data in zip(modules, modules_data):
+            videos.extend(Video(module=module, **video) for video in data.get('videos', ()))
+            documents.extend(Document(module=module, **document) for document in data.get('documents', ()))
+            for quiz_data in data.get('quizzes', ()):
+                quizzes.append(Quiz(module=module, title=quiz_data['title']))
+                quiz_questions.append(quiz_data.get('questions', ()))
+        Video.objects.bulk_create(videos)
+        Document.objects.bulk_create(documents)
+        Quiz.objects.bulk_create(quizzes)
+
+        questions, question_answers = [], []
+        for quiz, questions_data in zip(quizzes, quiz_questions):
+            for question_data in questions_data:
+                questions.append(Question(quiz=quiz, text=question_data['text']))
+                question_answers.append(question_data.get('answers', ()))
+        Question.objects.bulk_create(questions)
+
+        answers = Answer.objects.bulk_create([
+            Answer(question=question, **answer)
+            for question, answers_data in zip(questions, question_answers)
+            for answer in answers_data
+        ])
+
+        counts = {
+            'modules': len(modules),
+            'videos': len(videos),
+            'documents': len(documents),
+            'quizzes': len(quizzes),
+            'questions': len(questions),
+            'answers': len(answers),
+        }
+        adjust_course_counters({
+            'total_modules': counts['modules'],
+            'total_videos': counts['videos'],
+            'total_documents': counts['documents'],
+            'total_quizzes': counts['quizzes'],
+            'content_version': 1,
+        }, pk=course.pk)
+        refresh_completion([module.pk for module in modules])
+    return modules, counts
@@ -0,0 +1,80 @@
+"""Learner dashboard data computed with a fixed number of aggregate queries.
+
+One query loads the enrollments (with their course and instructor); one
+grouped query each counts completed videos and completed modules per course;
+documents read and per-quiz attempt summaries are one query each and are
+folded into per-course counts in Python. Item totals come from the counters
+stored on ``Course``, so no course tree is loaded.
+"""
+from collections import Counter
+
+from django.db.models import Count, Max
+
+from .models import DocumentProgress, Enrollment, ModuleProgress, QuizAttempt, VideoProgress
+
+
+def _count_by_course(queryset, course_path):
+    rows = queryset.order_by().values(course_path).annotate(total=Count('pk')).values_list(course_path, 'total')
+    return dict(rows)
+
+
+def course_progress(course, videos_completed, documents_read, quizzes_attempted, modules_completed):
+    items_total = course.total_videos + course.total_documents + course.total_quizzes
+    items_completed = videos_completed + documents_read + quizzes_attempted
+    return {
+        'videos_completed': videos_completed,
+        'documents_read': documents_read,
+        'quizzes_attempted': quizzes_attempted,
+        'modules_completed': modules_completed,
+        'items_completed': items_completed,
+        'items_total': items_total,
+        'percentage': round(100 * min(items_completed, items_total) / items_total, 1) if items_total else 0,
+    }
+
+
+def learner_dashboard(user):
+    """Enrollments, per-course progress, documents read and quiz summaries for ``user``."""
+    enrollments = list(
+        Enrollment.objects.filter(user=user)
+        .select_related('course__instructor', 'last_accessed_module')
+        .order_by('-enrolled_at', '-id')
+    )
+    videos = _count_by_course(VideoProgress.objects.filter(user=user, is_completed=True), 'video__module__course')
+    modules = _count_by_course(ModuleProgress.objects.filter(user=user, completed=True), 'module__course')
+
+    documents_read = [
+        {'id': row['document_id'], 'title': row['document__title'], 'course': row['document__module__course'], 'read_at': row['read_at']}
+        for row in DocumentProgress.objects.filter(user=user, read=True).order_by('-read_at', '-id').values(
+            'document_id', 'document__title', 'document__module__course', 'read_at',
+        )
+    ]
+    quizzes_done = [
+        {
+            'quiz': row['quiz_id'], 'title': row['quiz__title'], 'course': row['quiz__module__course'],
+            'attempts': row['attempts'], 'best_score': row['best_score'], 'last_attempt': row['last_attempt'],
+        }
+        for row in QuizAttempt.objects.filter(user=user).order_by().values(
+            'quiz_id', 'quiz__title', 'quiz__module__course',
+        ).annotate(
+            attempts=Count('pk'), best_score=Max('score'), last_attempt=Max('attempt_date'),
+        ).order_by('-last_attempt')
+    ]
+    documents = Counter(document['course'] for document in documents_read)
+    quizzes = Counter(quiz['course'] for quiz in quizzes_done)
+
+    progress = {
+        enrollment.course_id: course_progress(
+            enrollment.course,
+            videos.get(enrollment.course_id, 0),
+            documents[enrollment.course_id],
+            quizzes[enrollment.course_id],
+            modules.get(enrollment.course_id, 0),
+        )
+        for enrollment in enrollments
+    }
+    return {
+        'enrollments': enrollments,
+        'progress': progress,
+        'documents_read': documents_read,
+        'quizzes_done': quizzes_done,
+    }
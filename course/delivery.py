@@ -0,0 +1,46 @@
+"""Cached quiz delivery payloads.
+
+The payload a learner receives for a quiz (questions and answers, never
+``is_correct``) is serialized once per ``Quiz.version`` from a single prefetch
+and kept in the cache. ``shuffled`` reorders questions and answers for an
+attempt from a seed by rearranging the cached lists, without rebuilding them.
+"""
+import random
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from .models import Answer, Question, Quiz
+from .serializers import QuizDeliverySerializer
+
+PAYLOAD_TIMEOUT = 60 * 60 * 24
+
+
+def build_payload(quiz_id):
+    quiz = Quiz.objects.prefetch_related(
+        Prefetch('questions', queryset=Question.objects.order_by('pk').prefetch_related(
+            Prefetch('answers', queryset=Answer.objects.order_by('pk')),
+        )),
+    ).get(pk=quiz_id)
+    return QuizDeliverySerializer(quiz).data
+
+
+def delivery_payload(quiz):
+    """The serialized payload for ``quiz`` at its loaded ``version``."""
+    cache_key = f'quiz-delivery:{quiz.pk}:{quiz.version}'
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload = build_payload(quiz.pk)
+        cache.set(cache_key, payload, PAYLOAD_TIMEOUT)
+    return payload
+
+
+def shuffled(payload, seed):
+    """``payload`` with question and answer order shuffled reproducibly from ``seed``."""
+    rng = random.Random(f"{payload['id']}:{payload['version']}:{seed}")
+    questions = [
+        {**question, 'answers': rng.sample(question['answers'], len(question['answers']))}
+        for question in payload['questions']
+    ]
+    rng.shuffle(questions)
+    return {**payload, 'questions': questions, 'seed': seed}
@@ -0,0 +1,146 @@
+"""Server-side quiz grading against a compiled answer key.
+
+A quiz's answer key is compiled from a single query into an ``AnswerKey``:
+each answer id maps to its question and a bit, and each question keeps a
+bitmap of all its answers and of the correct ones. A question is answered
+correctly when the selected bits equal the correct bits exactly. Keys are
+cached in-process and in the Django cache per ``Quiz.version``, which is
+bumped whenever a question or answer changes, so a stale key is never used.
+"""
+from collections import Counter
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Question, QuestionResult, QuizAttempt
+from .progress import record_batch_progress
+
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+
+# (quiz id, version) -> AnswerKey for this process; cleared when full.
+_compiled = {}
+_COMPILED_MAX = 256
+
+
+class AnswerKey(NamedTuple):
+    questions: dict  # question id -> (all answers bitmap, correct answers bitmap)
+    answers: dict  # answer id -> (question id, bit)
+
+
+class GradingError(ValueError):
+    pass
+
+
+def compile_answer_key(quiz_id):
+    questions, answers = {}, {}
+    rows = Question.objects.filter(quiz_id=quiz_id).order_by('pk', 'answers__pk').values_list(
+        'pk', 'answers__pk', 'answers__is_correct',
+    )
+    for question_id, answer_id, is_correct in rows:
+        all_bits, correct_bits = questions.get(question_id, (0, 0))
+        if answer_id is not None:
+            bit = all_bits + 1  # answers take bits 1, 2, 4, ... in id order
+            answers[answer_id] = (question_id, bit)
+            all_bits |= bit
+            if is_correct:
+                correct_bits |= bit
+        questions[question_id] = (all_bits, correct_bits)
+    return AnswerKey(questions, answers)
+
+
+def answer_key(quiz):
+    """The compiled key for ``quiz`` at its loaded ``version``."""
+    key_id = (quiz.pk, quiz.version)
+    key = _compiled.get(key_id)
+    if key is None:
+        cache_key = 'quiz-answer-key:{}:{}'.format(*key_id)
+        key = cache.get(cache_key)
+        if key is None:
+            key = compile_answer_key(quiz.pk)
+            cache.set(cache_key, key, ANSWER_KEY_TIMEOUT)
+        if len(_compiled) >= _COMPILED_MAX:
+            _compiled.clear()
+        _compiled[key_id] = key
+    return key
+
+
+def grade(key, answer_ids):
+    """Grade selected ``answer_ids``; returns ``(correct_count, results)``.
+
+    ``results`` holds ``(question_id, selected answer ids, is_correct)`` for
+    every question of the quiz. Raises ``GradingError`` for answers that do
+    not belong to the quiz.
+    """
+    selected, chosen = {}, {}
+    for answer_id in answer_ids:
+        try:
+            question_id, bit = key.answers[answer_id]
+        except KeyError:
+            raise GradingError(f'Answer {answer_id} does not belong to this quiz.')
+        selected[question_id] = selected.get(question_id, 0) | bit
+        chosen.setdefault(question_id, []).append(answer_id)
+    results = [
+        (question_id, chosen.get(question_id, []), selected.get(question_id, 0) == correct_bits)
+        for question_id, (_, correct_bits) in key.questions.items()
+    ]
+    return sum(is_correct for _, _, is_correct in results), results
+
+
+def _score(correct, total):
+    return round(100 * correct / total, 2) if total else 0
+
+
+def record_attempt(user, quiz, answer_ids):
+    """Grade and store one attempt with its per-question results."""
+    key = answer_key(quiz)
+    correct, results = grade(key, answer_ids)
+    with transaction.atomic():
+        attempt = QuizAttempt.objects.create(
+            user=user, quiz=quiz, score=_score(correct, len(results)),
+            correct_count=correct, question_count=len(results),
+        )
+        QuestionResult.objects.bulk_create([
+            QuestionResult(attempt=attempt, question_id=question_id, selected_answers=selected, is_correct=is_correct)
+            for question_id, selected, is_correct in results
+        ])
+    return attempt
+
+
+def grade_submissions(quiz, submissions):
+    """Grade many ``(user_id, answer_ids)`` submissions in one pass and store them.
+
+    The key is resolved once; attempts and results are inserted with one
+    ``bulk_create`` each. Returns the attempts in submission order; raises
+    ``GradingError`` (naming the submission) before writing anything if any
+    submission is invalid.
+    """
+    key = answer_key(quiz)
+    graded = []
+    for index, (user_id, answer_ids) in enumerate(submissions):
+        try:
+            graded.append((user_id, *grade(key, answer_ids)))
+        except GradingError as exc:
+            raise GradingError(f'Submission {index}: {exc}')
+
+    user_ids = {user_id for user_id, _, _ in graded}
+    attempted = set(QuizAttempt.objects.filter(quiz=quiz, user__in=user_ids).values_list('user_id', flat=True))
+    with transaction.atomic():
+        attempts = QuizAttempt.objects.bulk_create([
+            QuizAttempt(
+                user_id=user_id, quiz=quiz, score=_score(correct, len(results)),
+                correct_count=correct, question_count=len(results),
+            )
+            for user_id, correct, results in graded
+        ])
+        QuestionResult.objects.bulk_create([
+            QuestionResult(attempt=attempt, question_id=question_id, selected_answers=selected, is_correct=is_correct)
+            for attempt, (_, _, results) in zip(attempts, graded)
+            for question_id, selected, is_correct in results
+        ])
+        # bulk_create sends no signals: a first attempt completes the quiz.
+        record_batch_progress(
+            Counter((user_id, quiz.module_id) for user_id in user_ids - attempted),
+            {user_id: quiz.module_id for user_id in user_ids},
+        )
+    return attempts
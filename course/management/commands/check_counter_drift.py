@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from course.counters import (
+    counter_drift, counter_expressions, module_counter_expressions,
+    reconcile_course_counters, reconcile_module_counters,
+)
+from course.models import Course, Module
+
+
+class Command(BaseCommand):
+    help = 'Report courses and modules whose stored counters differ from the live rows; --fix repairs them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='slugs', help='Only check this course slug (repeatable).')
+        parser.add_argument('--fix', action='store_true', help='Recompute the counters of drifted rows.')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        modules = Module.objects.all()
+        if options['slugs']:
+            courses = courses.filter(slug__in=options['slugs'])
+            modules = modules.filter(course__slug__in=options['slugs'])
+
+        course_expressions = counter_expressions()
+        module_expressions = module_counter_expressions()
+        drifted_courses = list(counter_drift(courses, course_expressions).order_by('pk'))
+        drifted_modules = list(counter_drift(modules.select_related('course'), module_expressions).order_by('pk'))
+
+        for course in drifted_courses:
+            self.stdout.write(f'course {course.slug}: {self.describe(course, course_expressions)}')
+        for module in drifted_modules:
+            self.stdout.write(f'module {module.pk} ({module.course.slug}): {self.describe(module, module_expressions)}')
+
+        if not drifted_courses and not drifted_modules:
+            self.stdout.write(self.style.SUCCESS('No counter drift.'))
+            return
+        if not options['fix']:
+            raise CommandError(
+                f'{len(drifted_courses)} course(s) and {len(drifted_modules)} module(s) have drifted counters; '
+                'rerun with --fix to repair them.'
+            )
+        reconcile_module_counters(Module.objects.filter(pk__in=[module.pk for module in drifted_modules]))
+        reconcile_course_counters(Course.objects.filter(pk__in=[course.pk for course in drifted_courses]))
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed {len(drifted_courses)} course(s) and {len(drifted_modules)} module(s).'
+        ))
+
+    def describe(self, row, expressions):
+        return ', '.join(
+            f'{name} {getattr(row, name)} != {getattr(row, f"expected_{name}")}'
+            for name in expressions
+            if getattr(row, name) != getattr(row, f'expected_{name}')
+        )
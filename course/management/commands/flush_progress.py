@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from course import progress_buffer
+
+
+class Command(BaseCommand):
+    help = 'Upsert buffered video/document progress (PROGRESS_WRITE_BEHIND) into the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep flushing every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        while True:
+            videos, documents = progress_buffer.flush()
+            if videos or documents or not options['loop']:
+                self.stdout.write(f'Flushed {videos} video and {documents} document progress row(s).')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from course import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all courses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING('This database has no course search index; nothing to rebuild.'))
+            return
+        indexed = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} course(s).'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from course.models import Enrollment
+from course.progress import recompute_enrollments
+
+
+class Command(BaseCommand):
+    help = 'Recompute module progress and completion for enrollments from the stored progress rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='slugs', help='Only recompute this course slug (repeatable).')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        enrollments = Enrollment.objects.order_by('pk')
+        if options['slugs']:
+            enrollments = enrollments.filter(course__slug__in=options['slugs'])
+
+        done = 0
+        last_pk = 0
+        while True:
+            chunk = list(enrollments.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['chunk_size']])
+            if not chunk:
+                break
+            done += recompute_enrollments(Enrollment.objects.filter(pk__in=chunk))
+            last_pk = chunk[-1]
+            self.stdout.write(f'Recomputed {done} enrollment(s)...')
+        self.stdout.write(self.style.SUCCESS(f'Recomputed progress for {done} enrollment(s).'))
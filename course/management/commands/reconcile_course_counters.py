@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from course.counters import reconcile_course_counters, reconcile_module_counters
+from course.models import Course, Module
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored content, student and rating counters on every course and module.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='slugs', help='Only reconcile this course slug (repeatable).')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        modules = Module.objects.all()
+        if options['slugs']:
+            courses = courses.filter(slug__in=options['slugs'])
+            modules = modules.filter(course__slug__in=options['slugs'])
+        updated_modules = reconcile_module_counters(modules)
+        updated = reconcile_course_counters(courses)
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled counters for {updated} course(s) and {updated_modules} module(s).'
+        ))
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.15 on 2026-10-18 09:40
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_ratings(apps, schema_editor):
+    Course = apps.get_model('course', 'Course')
+    CourseReview = apps.get_model('course', 'CourseReview')
+
+    def per_course(aggregate, **filters):
+        values = CourseReview.objects.filter(course=OuterRef('pk'), visible=True, **filters).order_by().values(
+            'course'
+        ).annotate(total=aggregate).values('total')
+        return Coalesce(Subquery(values, output_field=IntegerField()), Value(0))
+
+    Course.objects.update(
+        rating_count=per_course(Count('pk')),
+        rating_sum=per_course(Sum('rating')),
+        **{f'rating_{stars}': per_course(Count('pk'), rating=stars) for stars in range(1, 6)},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0002_course_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
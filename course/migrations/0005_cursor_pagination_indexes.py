@@ -0,0 +1,29 @@
+# Generated by Django 4.2.15 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0004_course_content_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-created_at', '-id'], name='course_cour_created_13b54b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['ispublished', '-created_at', '-id'], name='course_cour_ispubli_852b2b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['instructor', 'ispublished', '-created_at', '-id'], name='course_cour_instruc_a112e2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['user', '-enrolled_at', '-id'], name='course_enro_user_id_dff9c1_idx'),
+        ),
+    ]
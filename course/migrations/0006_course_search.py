@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# Kept in sync with course.search, which reads and writes these tables.
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS course_search USING fts5("
+    "title, tags, description, tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+POSTGRES_CREATE = (
+    "CREATE TABLE IF NOT EXISTS course_search ("
+    "course_id bigint PRIMARY KEY REFERENCES course_course (id) ON DELETE CASCADE, "
+    "title text NOT NULL, tags text NOT NULL, description text NOT NULL, "
+    "document tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', tags), 'B') || "
+    "setweight(to_tsvector('simple', description), 'C')) STORED)",
+    "CREATE INDEX IF NOT EXISTS course_search_document_idx ON course_search USING gin (document)",
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        key = 'rowid'
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+        key = 'course_id'
+    else:
+        return
+
+    Course = apps.get_model('course', 'Course')
+    rows = [
+        (course.pk, course.title, ' '.join(tag.name for tag in course.tags.all()), course.description or '')
+        for course in Course.objects.prefetch_related('tags').iterator(chunk_size=500)
+    ]
+    if rows:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO course_search ({key}, title, tags, description) VALUES (%s, %s, %s, %s)', rows,
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS course_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0005_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.15 on 2026-10-18 09:50
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def reconcile_module_counters(apps, schema_editor):
+    # Deletes never used to decrement module totals; start from exact counts.
+    Module = apps.get_model('course', 'Module')
+
+    def per_module(model_name):
+        model = apps.get_model('course', model_name)
+        values = model.objects.filter(module=OuterRef('pk')).order_by().values('module').annotate(
+            total=Count('pk')
+        ).values('total')
+        return Coalesce(Subquery(values, output_field=IntegerField()), Value(0))
+
+    Module.objects.update(
+        total_videos=per_module('Video'),
+        total_documents=per_module('Document'),
+        total_quizzes=per_module('Quiz'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0006_course_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(reconcile_module_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.15 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0007_reconcile_module_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='completed_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericRelation
 from django.core.exceptions import ValidationError
@@ -17,11 +17,36 @@ class Course(models.Model):
     ispublished = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    total_modules = models.PositiveIntegerField(default=0)
+    total_videos = models.PositiveIntegerField(default=0)
+    total_documents = models.PositiveIntegerField(default=0)
+    total_quizzes = models.PositiveIntegerField(default=0)
+    total_students = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    content_version = models.PositiveIntegerField(default=0)
     payments = GenericRelation(Payment, related_query_name='course')
 
+    # Maintained with F() updates by course.counters; never written by save().
+    COUNTER_FIELDS = (
+        'total_modules', 'total_videos', 'total_documents', 'total_quizzes', 'total_students',
+        'rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+        'content_version',
+    )
+
     class Meta:
         indexes = [
             models.Index(fields=['slug']),
+            # Cursor pagination seeks on (created_at, id) for the catalog,
+            # the public catalog and instructor drafts.
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['ispublished', '-created_at', '-id']),
+            models.Index(fields=['instructor', 'ispublished', '-created_at', '-id']),
         ]
 
     def __str__(self):
@@ -34,8 +59,23 @@ class Course(models.Model):
             while Course.objects.filter(slug=unique_slug).exists():
                 unique_slug = f"{self.slug}-{uuid.uuid4().hex[:6]}"
             self.slug = unique_slug
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
 
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+
+    @property
+    def rating_histogram(self):
+        return {str(stars): getattr(self, f'rating_{stars}') for stars in range(1, 6)}
+
 class Module(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='modules')
     title = models.CharField(max_length=255)
@@ -44,6 +84,9 @@ class Module(models.Model):
     total_documents = models.PositiveIntegerField(default=0)
     total_quizzes = models.PositiveIntegerField(default=0)
 
+    # Maintained with F() updates by course.counters; never written by save().
+    COUNTER_FIELDS = ('total_videos', 'total_documents', 'total_quizzes')
+
     class Meta:
         ordering = ['order']
         indexes = [
@@ -53,6 +96,14 @@ class Module(models.Model):
     def __str__(self):
         return f"{self.title} - {self.course.title}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 class Video(models.Model):
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='videos')
     title = models.CharField(max_length=255)
@@ -62,11 +113,6 @@ class Video(models.Model):
     def __str__(self):
         return f"{self.title} - {self.module.title}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.module.total_videos = self.module.videos.count()
-        self.module.save()
-
 class Document(models.Model):
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='documents')
     title = models.CharField(max_length=255)
@@ -75,22 +121,25 @@ class Document(models.Model):
     def __str__(self):
         return f"{self.title} - {self.module.title}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.module.total_documents = self.module.documents.count()
-        self.module.save()
-
 class Quiz(models.Model):
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='quizzes')
     title = models.CharField(max_length=255)
+    # Bumped whenever the quiz, a question or an answer changes; keys the
+    # cached answer key and delivery payload.
+    version = models.PositiveIntegerField(default=0)
+
+    COUNTER_FIELDS = ('version',)
 
     def __str__(self):
         return f"{self.title} - {self.module.title}"
 
     def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
-        self.module.total_quizzes = self.module.quizzes.count()
-        self.module.save()
 
 class Question(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='questions')
@@ -117,31 +166,89 @@ class Enrollment(models.Model):
     last_accessed_module = models.ForeignKey(Module, null=True, blank=True, on_delete=models.SET_NULL)
     progress_notes = models.TextField(blank=True)
     certificate_issued = models.BooleanField(default=False)
+    completed_items = models.PositiveIntegerField(default=0)
+
+    # Maintained with F() updates by course.progress; never written by save().
+    PROGRESS_FIELDS = ('completed_items', 'completion_percentage', 'is_completed')
 
     class Meta:
         unique_together = ('user', 'course')
+        indexes = [
+            models.Index(fields=['user', '-enrolled_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.course.title}"
 
-class VideoProgress(models.Model):
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.PROGRESS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+class CompletionProgress(models.Model):
+    """A learner's progress row whose completion flag counts towards their
+    module and course progress (see ``course.signals``).
+
+    ``save`` and ``delete`` move the stored flag with a conditional UPDATE
+    first, so of several concurrent writers only the one that actually
+    changes it records a ``completion_delta``.
+    """
+    completion_field = None
+
+    # Completed items added (1) or removed (-1) by the last save or delete;
+    # None until one ran on this instance.
+    completion_delta = None
+
+    class Meta:
+        abstract = True
+
+    def _move_completion(self, completed):
+        rows = type(self)._base_manager.filter(pk=self.pk, **{self.completion_field: not completed})
+        moved = rows.update(**{self.completion_field: completed})
+        return moved if completed else -moved
+
+    def save(self, *args, **kwargs):
+        completed = getattr(self, self.completion_field)
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            if self._state.adding:
+                self.completion_delta = int(completed)
+            elif update_fields is not None and self.completion_field not in update_fields:
+                self.completion_delta = 0
+            else:
+                self.completion_delta = self._move_completion(completed)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.completion_delta = self._move_completion(False)
+            return super().delete(*args, **kwargs)
+
+class VideoProgress(CompletionProgress):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_progress')
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='progress')
     watched_duration = models.PositiveIntegerField(default=0)  # Seconds watched
     is_completed = models.BooleanField(default=False)
 
+    completion_field = 'is_completed'
+
     class Meta:
         unique_together = ('user', 'video')
 
     def __str__(self):
         return f"{self.user} - {self.video.title}"
 
-class DocumentProgress(models.Model):
+class DocumentProgress(CompletionProgress):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_progress')
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='progress')
     read = models.BooleanField(default=False)
     read_at = models.DateTimeField(null=True, blank=True)
 
+    completion_field = 'read'
+
     class Meta:
         unique_together = ('user', 'document')
 
@@ -152,17 +259,35 @@ class QuizAttempt(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
     score = models.FloatField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    question_count = models.PositiveIntegerField(default=0)
     attempt_date = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.user} - {self.quiz.title} - Score: {self.score}"
 
+class QuestionResult(models.Model):
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='results')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='results')
+    selected_answers = models.JSONField(default=list)
+    is_correct = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('attempt', 'question')
+
+    def __str__(self):
+        return f"{self.attempt} - {self.question.text[:50]} - {'correct' if self.is_correct else 'wrong'}"
+
 class ModuleProgress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='module_progress')
     enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='module_progress')
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='progress')
     completed = models.BooleanField(default=False)
     completion_date = models.DateTimeField(null=True, blank=True)
+    completed_items = models.PositiveIntegerField(default=0)
+
+    # Maintained with F() updates by course.progress; never written by save().
+    PROGRESS_FIELDS = ('completed_items',)
 
     class Meta:
         unique_together = ('enrollment', 'module')
@@ -170,6 +295,14 @@ class ModuleProgress(models.Model):
     def __str__(self):
         return f"{self.user} - {self.module.title}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.PROGRESS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 class FAQ(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='faqs')
     question = models.TextField()
@@ -196,8 +329,40 @@ class CourseReview(models.Model):
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Fields that make up a review's contribution to the course rating, as
+    # (field name, attribute).
+    RATED_FIELDS = (('course', 'course_id'), ('visible', 'visible'), ('rating', 'rating'))
+
     class Meta:
         unique_together = ('course', 'user')
 
     def __str__(self):
-        return f"{self.user} - {self.course.title} - Rating: {self.rating}"
\ No newline at end of file
+        return f"{self.user} - {self.course.title} - Rating: {self.rating}"
+
+    def _stored_rating(self):
+        """The stored ``(course_id, visible, rating)``, locking the row; None if there is none."""
+        return type(self)._base_manager.select_for_update().filter(pk=self.pk).values_list(
+            *(attname for _, attname in self.RATED_FIELDS)
+        ).first()
+
+    def save(self, *args, **kwargs):
+        # The course rating aggregate is adjusted in post_save from the row as
+        # stored, not as this instance last saw it; keep both in one
+        # transaction.
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            before = None if self._state.adding else self._stored_rating()
+            after = tuple(getattr(self, attname) for _, attname in self.RATED_FIELDS)
+            if before is not None and update_fields is not None:
+                # Fields left out of update_fields keep their stored value.
+                after = tuple(
+                    value if name in update_fields or attname in update_fields else stored
+                    for (name, attname), value, stored in zip(self.RATED_FIELDS, after, before)
+                )
+            self.rating_change = (before, after)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.rating_change = (self._stored_rating(), None)
+            return super().delete(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,372 @@
+"""Incremental learner progress on ``ModuleProgress`` and ``Enrollment``.
+
+A learning item counts as completed when its ``VideoProgress`` is completed,
+its ``DocumentProgress`` is read, or, for a quiz, once the learner has at
+least one ``QuizAttempt``. Receivers in ``course.signals`` pass every change
+to ``record_progress``, which moves ``completed_items`` on the learner's
+module progress and enrollment with ``F()`` updates and derives
+``completed``/``completion_percentage``/``is_completed`` from the stored
+module and course totals in the same UPDATE. It also stamps ``started_at``
+and ``last_accessed_module``.
+
+``refresh_completion`` re-derives the flags when item totals change, and
+``recompute_enrollments`` rebuilds everything from the progress rows for
+backfills (see the ``recompute_progress`` command).
+"""
+import operator
+from collections import Counter
+from functools import reduce
+
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case, Count, DateTimeField, F, FloatField, OuterRef, PositiveIntegerField, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, NullIf
+from django.utils import timezone
+
+from .models import (
+    Course, Document, DocumentProgress, Enrollment, Module, ModuleProgress, QuizAttempt, Video, VideoProgress,
+)
+
+MODULE_ITEMS = F('total_videos') + F('total_documents') + F('total_quizzes')
+COURSE_ITEMS = F('course__total_videos') + F('course__total_documents') + F('course__total_quizzes')
+
+
+def _items_after(delta):
+    expression = F('completed_items') + delta
+    return expression if delta > 0 else Greatest(expression, Value(0))
+
+
+def _reached(delta, total):
+    # SET expressions see the row as it was before the UPDATE, so compare the
+    # old count against the total shifted by ``delta``.
+    return Q(completed_items__gte=total - delta)
+
+
+def _module_updates(delta, total, now):
+    reached = _reached(delta, total)
+    return {
+        'completed_items': _items_after(delta),
+        'completed': Case(When(reached, then=Value(True)), default=Value(False)),
+        'completion_date': Case(
+            When(reached, then=Coalesce(F('completion_date'), Value(now))),
+            default=Value(None, output_field=DateTimeField()),
+        ),
+    }
+
+
+def _enrollment_updates(delta, total):
+    if not total:
+        return {'completed_items': _items_after(delta), 'completion_percentage': Value(0.0), 'is_completed': Value(False)}
+    items = Cast(F('completed_items'), FloatField()) + Value(float(delta))
+    return {
+        'completed_items': _items_after(delta),
+        'completion_percentage': Least(Greatest(items * Value(100.0 / total), Value(0.0)), Value(100.0)),
+        'is_completed': Case(When(_reached(delta, total), then=Value(True)), default=Value(False)),
+    }
+
+
+def record_progress(user_id, module_lookup, delta=0, touch=True):
+    """Apply a change of ``delta`` completed items in one module for one learner.
+
+    ``module_lookup`` finds the module, e.g. ``{'videos': video_id}``. With
+    ``touch`` the enrollment is also marked as started and last accessed in
+    that module. Learners who are not enrolled in the course are ignored.
+    Costs one read plus one UPDATE per row touched, however large the course.
+    """
+    if not delta and not touch:
+        return
+    module = Module.objects.filter(**module_lookup).annotate(
+        enrollment_id=Subquery(
+            Enrollment.objects.filter(user_id=user_id, course=OuterRef('course')).values('pk')[:1]
+        ),
+        module_items=MODULE_ITEMS,
+        course_items=COURSE_ITEMS,
+    ).values('pk', 'enrollment_id', 'module_items', 'course_items').first()
+    if module is None or module['enrollment_id'] is None:
+        return
+
+    now = timezone.now()
+    enrollment_updates = {}
+    if touch:
+        enrollment_updates['started_at'] = Coalesce(F('started_at'), Value(now))
+        enrollment_updates['last_accessed_module'] = module['pk']
+    with transaction.atomic():
+        if delta:
+            _apply_module_delta(user_id, module, delta, now)
+            enrollment_updates.update(_enrollment_updates(delta, module['course_items']))
+        Enrollment.objects.filter(pk=module['enrollment_id']).update(**enrollment_updates)
+
+
+def _apply_module_delta(user_id, module, delta, now):
+    rows = ModuleProgress.objects.filter(enrollment_id=module['enrollment_id'], module_id=module['pk'])
+    updates = _module_updates(delta, module['module_items'], now)
+    if rows.update(**updates) or delta < 0:
+        return
+    completed = delta >= module['module_items']
+    try:
+        with transaction.atomic():
+            ModuleProgress.objects.create(
+                user_id=user_id, enrollment_id=module['enrollment_id'], module_id=module['pk'],
+                completed_items=delta, completed=completed, completion_date=now if completed else None,
+            )
+    except IntegrityError:
+        # Created concurrently since the UPDATE above.
+        rows.update(**updates)
+
+
+def record_video_heartbeats(user_id, events):
+    """Upsert a batch of player heartbeats for one learner.
+
+    ``events`` are ``{'video', 'watched_duration', 'is_completed'}`` dicts.
+    Returns ``(rows, unknown_video_ids)``; see ``upsert_video_heartbeats``.
+    """
+    return upsert_video_heartbeats({user_id: events})
+
+
+def _by_user(keys):
+    items = {}
+    for user_id, item_id in keys:
+        items.setdefault(user_id, []).append(item_id)
+    return items
+
+
+def _for_keys(field, keys):
+    return reduce(operator.or_, (
+        Q(user_id=user_id, **{f'{field}__in': item_ids}) for user_id, item_ids in _by_user(keys).items()
+    ))
+
+
+def _stored_rows(model, field, keys):
+    """The progress rows for ``(user id, item id)`` ``keys``, in that order."""
+    rows = model.objects.filter(_for_keys(field, keys))
+    stored = {(row.user_id, getattr(row, f'{field}_id')): row for row in rows}
+    return [stored[key] for key in keys]
+
+
+def _per_row(field, values, default, output_field):
+    """``values[user id, item id]`` for the row being updated, else ``default``."""
+    return Case(
+        *(When(user_id=user_id, **{f'{field}_id': item_id}, then=Value(value))
+          for (user_id, item_id), value in values.items()),
+        default=default, output_field=output_field,
+    )
+
+
+def _complete(model, field, keys, modules, **updates):
+    """Set the completion flag on the stored rows for ``keys`` that lack it.
+
+    One conditional UPDATE per learner and module, so a concurrent batch that
+    completes the same item first leaves nothing for this one to count.
+    Returns the completed counts per ``(user, module)``.
+    """
+    by_module = {}
+    for user_id, item_id in keys:
+        by_module.setdefault((user_id, modules[item_id]), []).append(item_id)
+    flag = model.completion_field
+    newly_completed = Counter()
+    for (user_id, module_id), item_ids in by_module.items():
+        moved = model.objects.filter(user_id=user_id, **{f'{field}__in': item_ids, flag: False}).update(
+            **{flag: True}, **updates,
+        )
+        if moved:
+            newly_completed[user_id, module_id] = moved
+    return newly_completed
+
+
+def upsert_video_heartbeats(events_by_user):
+    """Upsert heartbeats for many learners (user id -> events) at once.
+
+    Events are coalesced per learner and video (longest duration, completed
+    if any event says so). Missing rows are inserted with one ``bulk_create``,
+    then the stored rows are moved in SQL so neither value ever goes back:
+    one UPDATE takes the ``Greatest`` of the stored and new durations, and
+    completions are counted from conditional UPDATEs (see ``_complete``).
+    Videos completed by the batch go through ``record_progress`` once per
+    learner and module, and each learner is marked as last accessing the
+    module of their last event.
+    """
+    merged, last_video = {}, {}
+    for user_id, events in events_by_user.items():
+        for event in events:
+            key = (user_id, event['video'])
+            duration, completed = merged.get(key, (0, False))
+            merged[key] = (max(duration, event['watched_duration']), completed or event['is_completed'])
+            last_video[user_id] = event['video']
+    video_ids = {video_id for _, video_id in merged}
+    modules = dict(Video.objects.filter(pk__in=video_ids).values_list('pk', 'module_id'))
+    unknown = sorted(video_ids - set(modules))
+    merged = {key: values for key, values in merged.items() if key[1] in modules}
+    if not merged:
+        return [], unknown
+
+    durations = {key: duration for key, (duration, _) in merged.items() if duration}
+    with transaction.atomic():
+        VideoProgress.objects.bulk_create(
+            [VideoProgress(user_id=user_id, video_id=video_id) for user_id, video_id in merged],
+            ignore_conflicts=True, batch_size=500,
+        )
+        if durations:
+            VideoProgress.objects.filter(_for_keys('video', durations)).update(watched_duration=Greatest(
+                F('watched_duration'), _per_row('video', durations, F('watched_duration'), PositiveIntegerField()),
+            ))
+        newly_completed = _complete(
+            VideoProgress, 'video', [key for key, (_, completed) in merged.items() if completed], modules,
+        )
+        record_batch_progress(newly_completed, {
+            user_id: modules[video_id] for user_id, video_id in last_video.items() if video_id in modules
+        })
+    return _stored_rows(VideoProgress, 'video', list(merged)), unknown
+
+
+def upsert_document_reads(events_by_user):
+    """Upsert document reads for many learners (user id -> events) at once.
+
+    Events are ``{'document', 'read', 'read_at'}`` dicts. A document stays
+    read once any event marks it read, and keeps its earliest ``read_at``;
+    as for videos, reads are counted from conditional UPDATEs.
+    Returns ``(rows, unknown_document_ids)``.
+    """
+    merged, last_document = {}, {}
+    for user_id, events in events_by_user.items():
+        for event in events:
+            key = (user_id, event['document'])
+            read, read_at = merged.get(key, (False, None))
+            if event['read']:
+                read_at = min(filter(None, (read_at, event['read_at'])), default=None)
+            merged[key] = (read or event['read'], read_at)
+            last_document[user_id] = event['document']
+    document_ids = {document_id for _, document_id in merged}
+    modules = dict(Document.objects.filter(pk__in=document_ids).values_list('pk', 'module_id'))
+    unknown = sorted(document_ids - set(modules))
+    merged = {key: values for key, values in merged.items() if key[1] in modules}
+    if not merged:
+        return [], unknown
+
+    read_ats = {key: read_at for key, (read, read_at) in merged.items() if read}
+    with transaction.atomic():
+        DocumentProgress.objects.bulk_create(
+            [DocumentProgress(user_id=user_id, document_id=document_id) for user_id, document_id in merged],
+            ignore_conflicts=True, batch_size=500,
+        )
+        newly_completed = _complete(
+            DocumentProgress, 'document', list(read_ats), modules,
+            read_at=Coalesce(F('read_at'), _per_row('document', read_ats, None, DateTimeField())),
+        )
+        record_batch_progress(newly_completed, {
+            user_id: modules[document_id]
+            for user_id, document_id in last_document.items() if document_id in modules
+        })
+    return _stored_rows(DocumentProgress, 'document', list(merged)), unknown
+
+
+def record_batch_progress(newly_completed, last_modules):
+    """Feed ``(user, module) -> completed count`` and each learner's last module to the engine."""
+    for (user_id, module_id), delta in newly_completed.items():
+        record_progress(user_id, {'pk': module_id}, delta, touch=last_modules.get(user_id) == module_id)
+    for user_id, module_id in last_modules.items():
+        if (user_id, module_id) not in newly_completed:
+            record_progress(user_id, {'pk': module_id})
+
+
+def refresh_completion(module_ids):
+    """Re-derive completion after the item totals of ``module_ids`` changed."""
+    module_ids = list(module_ids)
+    if not module_ids:
+        return
+    module_items = Subquery(Module.objects.filter(pk=OuterRef('module')).annotate(items=MODULE_ITEMS).values('items'))
+    module_reached = Q(completed_items__gte=module_items) & ~Q(completed_items=0)
+    ModuleProgress.objects.filter(module__in=module_ids).update(
+        completed=Case(When(module_reached, then=Value(True)), default=Value(False)),
+        completion_date=Case(
+            When(module_reached, then=Coalesce(F('completion_date'), Value(timezone.now()))),
+            default=Value(None, output_field=DateTimeField()),
+        ),
+    )
+
+    course_items = Subquery(Course.objects.filter(pk=OuterRef('course')).annotate(
+        items=F('total_videos') + F('total_documents') + F('total_quizzes'),
+    ).values('items'))
+    percentage = Cast(F('completed_items'), FloatField()) * Value(100.0) / NullIf(
+        Cast(course_items, FloatField()), Value(0.0),
+    )
+    Enrollment.objects.filter(course__modules__in=module_ids).update(
+        completion_percentage=Coalesce(Least(percentage, Value(100.0)), Value(0.0)),
+        is_completed=Case(
+            When(Q(completed_items__gte=course_items) & ~Q(completed_items=0), then=Value(True)),
+            default=Value(False),
+        ),
+    )
+
+
+def _count_items(rows):
+    counts = Counter()
+    for user_id, module_id, total in rows:
+        counts[user_id, module_id] += total
+    return counts
+
+
+def recompute_enrollments(enrollments):
+    """Rebuild module progress and enrollment completion for ``enrollments``.
+
+    Runs a fixed number of queries for the whole batch; returns the number of
+    enrollments updated.
+    """
+    enrollments = list(enrollments.select_related('course'))
+    if not enrollments:
+        return 0
+    user_ids = {enrollment.user_id for enrollment in enrollments}
+    course_ids = {enrollment.course_id for enrollment in enrollments}
+
+    modules = list(Module.objects.filter(course__in=course_ids).annotate(items=MODULE_ITEMS).values_list(
+        'pk', 'course_id', 'items',
+    ))
+    completed = _count_items(VideoProgress.objects.filter(
+        user__in=user_ids, video__module__course__in=course_ids, is_completed=True,
+    ).order_by().values('user', 'video__module').annotate(total=Count('pk')).values_list('user', 'video__module', 'total'))
+    completed += _count_items(DocumentProgress.objects.filter(
+        user__in=user_ids, document__module__course__in=course_ids, read=True,
+    ).order_by().values('user', 'document__module').annotate(total=Count('pk')).values_list('user', 'document__module', 'total'))
+    completed += _count_items(QuizAttempt.objects.filter(
+        user__in=user_ids, quiz__module__course__in=course_ids,
+    ).order_by().values('user', 'quiz__module').annotate(
+        total=Count('quiz', distinct=True),
+    ).values_list('user', 'quiz__module', 'total'))
+
+    existing = {
+        (progress.enrollment_id, progress.module_id): progress
+        for progress in ModuleProgress.objects.filter(enrollment__in=enrollments)
+    }
+    now = timezone.now()
+    course_modules = {}
+    for module_id, course_id, items in modules:
+        course_modules.setdefault(course_id, []).append((module_id, items))
+
+    progress_rows = []
+    for enrollment in enrollments:
+        course = enrollment.course
+        total = course.total_videos + course.total_documents + course.total_quizzes
+        done = 0
+        for module_id, items in course_modules.get(enrollment.course_id, ()):
+            count = completed[enrollment.user_id, module_id]
+            done += count
+            progress = existing.get((enrollment.pk, module_id))
+            if progress is None and not count:
+                continue
+            is_done = bool(count) and count >= items
+            completion_date = (progress.completion_date if progress else None) or now
+            progress_rows.append(ModuleProgress(
+                user_id=enrollment.user_id, enrollment_id=enrollment.pk, module_id=module_id,
+                completed_items=count, completed=is_done, completion_date=completion_date if is_done else None,
+            ))
+        enrollment.completed_items = done
+        enrollment.completion_percentage = min(100.0, done * 100.0 / total) if total else 0.0
+        enrollment.is_completed = bool(total) and done >= total
+
+    with transaction.atomic():
+        ModuleProgress.objects.bulk_create(
+            progress_rows, update_conflicts=True, unique_fields=['enrollment', 'module'],
+            update_fields=['completed_items', 'completed', 'completion_date'],
+        )
+        Enrollment.objects.bulk_update(enrollments, ['completed_items', 'completion_percentage', 'is_completed'])
+    return len(enrollments)
@@ -0,0 +1,215 @@
+"""Write-behind buffer for video and document progress.
+
+Enabled with ``PROGRESS_WRITE_BEHIND``. Each worker process appends events
+as JSON lines to its own spool file in ``PROGRESS_SPOOL_DIR``, under an
+exclusive ``flock`` so the flusher never reads a half-written batch.
+``flush`` runs under an exclusive ``flock`` on ``flush.lock``, so only one
+flusher per host works at a time. It claims every spool file (copies it
+aside and truncates it under the spool's lock), groups the events by learner
+and hands them to ``upsert_video_heartbeats``/``upsert_document_reads``.
+Those are idempotent, so a claimed file left behind by a failed flush is
+simply replayed by the next one.
+
+Until a flush lands, ``overlay`` lets learners read back their own values:
+every append is also max-merged into a per-learner cache entry, under
+``overlay.lock``. Once a flush has written them, the flushed values are
+dropped from the overlay, and a learner's entry is deleted when nothing
+newer is left in it.
+"""
+import contextlib
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .progress import upsert_document_reads, upsert_video_heartbeats
+
+logger = logging.getLogger(__name__)
+
+VIDEO = 'video'
+DOCUMENT = 'document'
+
+# Progress values carried by each kind of event.
+FIELDS = {
+    VIDEO: ('watched_duration', 'is_completed'),
+    DOCUMENT: ('read', 'read_at'),
+}
+
+
+def enabled():
+    return settings.PROGRESS_WRITE_BEHIND
+
+
+@contextlib.contextmanager
+def _locked(name):
+    os.makedirs(settings.PROGRESS_SPOOL_DIR, exist_ok=True)
+    with open(os.path.join(settings.PROGRESS_SPOOL_DIR, name), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _overlay_key(user_id):
+    return f'progress-overlay:{user_id}'
+
+
+def overlay(user_id):
+    """Unflushed values for a learner: ``{'video': {id: {...}}, 'document': {id: {...}}}``."""
+    return cache.get(_overlay_key(user_id)) or {VIDEO: {}, DOCUMENT: {}}
+
+
+def _combine(kind, current, values):
+    if current is None:
+        return dict(values)
+    if kind == VIDEO:
+        return {
+            'watched_duration': max(current['watched_duration'], values['watched_duration']),
+            'is_completed': current['is_completed'] or values['is_completed'],
+        }
+    return {
+        'read': current['read'] or values['read'],
+        'read_at': current['read_at'] or values['read_at'],
+    }
+
+
+def _covers(kind, flushed, pending):
+    if kind == VIDEO:
+        return flushed['watched_duration'] >= pending['watched_duration'] and (
+            flushed['is_completed'] or not pending['is_completed']
+        )
+    return flushed['read'] or not pending['read']
+
+
+def _merge_overlay(user_id, kind, events):
+    with _locked('overlay.lock'):
+        pending = overlay(user_id)
+        items = pending[kind]
+        for event in events:
+            item_id = event[kind]
+            values = {field: event[field] for field in FIELDS[kind]}
+            items[item_id] = _combine(kind, items.get(item_id), values)
+        cache.set(_overlay_key(user_id), pending, settings.PROGRESS_OVERLAY_TIMEOUT)
+    return items
+
+
+def _clear_overlay(flushed):
+    """Drop overlay items covered by ``flushed`` (kind -> user id -> events)."""
+    user_ids = set(flushed[VIDEO]) | set(flushed[DOCUMENT])
+    with _locked('overlay.lock'):
+        for user_id in user_ids:
+            pending = overlay(user_id)
+            for kind, items in pending.items():
+                written = {}
+                for event in flushed[kind].get(user_id, ()):
+                    values = {field: event[field] for field in FIELDS[kind]}
+                    written[event[kind]] = _combine(kind, written.get(event[kind]), values)
+                for item_id, values in written.items():
+                    if item_id in items and _covers(kind, values, items[item_id]):
+                        del items[item_id]
+            if any(pending.values()):
+                cache.set(_overlay_key(user_id), pending, settings.PROGRESS_OVERLAY_TIMEOUT)
+            else:
+                cache.delete(_overlay_key(user_id))
+
+
+def read_back(user_id, kind, item_ids, stored):
+    """Merge stored ``{item_id: values}`` with the learner's unflushed values for ``item_ids``."""
+    merged = {item_id: dict(values) for item_id, values in stored.items()}
+    if enabled():
+        for item_id, values in overlay(user_id)[kind].items():
+            if item_id in item_ids:
+                merged[item_id] = _combine(kind, merged.get(item_id), values)
+    return merged
+
+
+def _spool_path():
+    return os.path.join(settings.PROGRESS_SPOOL_DIR, f'progress-{os.getpid()}.jsonl')
+
+
+def append(user_id, kind, events):
+    """Buffer ``events`` for a learner; returns the learner's merged overlay items."""
+    if kind == DOCUMENT:
+        now = timezone.now().isoformat()
+        events = [{**event, 'read_at': now if event['read'] else None} for event in events]
+    lines = ''.join(json.dumps({'kind': kind, 'user': user_id, **event}) + '\n' for event in events)
+    os.makedirs(settings.PROGRESS_SPOOL_DIR, exist_ok=True)
+    with open(_spool_path(), 'a') as spool:
+        fcntl.flock(spool, fcntl.LOCK_EX)
+        try:
+            spool.write(lines)
+            spool.flush()
+        finally:
+            fcntl.flock(spool, fcntl.LOCK_UN)
+    return _merge_overlay(user_id, kind, events)
+
+
+def claim():
+    """Move every buffered line into ``.claimed`` files; returns the paths written."""
+    paths = []
+    for path in glob.glob(os.path.join(settings.PROGRESS_SPOOL_DIR, 'progress-*.jsonl')):
+        with open(path, 'r+') as spool:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+            try:
+                data = spool.read()
+                if data:
+                    claimed_path = f'{path}.{time.time_ns()}.claimed'
+                    with open(claimed_path, 'w') as claimed:
+                        claimed.write(data)
+                        claimed.flush()
+                        os.fsync(claimed.fileno())
+                    spool.truncate(0)
+                    paths.append(claimed_path)
+            finally:
+                fcntl.flock(spool, fcntl.LOCK_UN)
+    return paths
+
+
+def _read_events(paths):
+    videos, documents = defaultdict(list), defaultdict(list)
+    for path in paths:
+        with open(path) as claimed:
+            for number, line in enumerate(claimed, 1):
+                try:
+                    event = json.loads(line)
+                    if event['kind'] == VIDEO:
+                        videos[event['user']].append({
+                            'video': event['video'],
+                            'watched_duration': event['watched_duration'],
+                            'is_completed': event['is_completed'],
+                        })
+                    else:
+                        documents[event['user']].append({
+                            'document': event['document'],
+                            'read': event['read'],
+                            'read_at': parse_datetime(event['read_at']) if event['read_at'] else None,
+                        })
+                except (ValueError, KeyError, TypeError):
+                    logger.warning('Skipping malformed progress event at %s:%d', path, number)
+    return videos, documents
+
+
+def flush():
+    """Upsert all buffered events; returns ``(video_rows, document_rows)`` written."""
+    with _locked('flush.lock'):
+        # Holding the lock, any claimed file already here was left by a
+        # flush that failed; replay it along with this run's.
+        paths = sorted(glob.glob(os.path.join(settings.PROGRESS_SPOOL_DIR, '*.claimed'))) + claim()
+        if not paths:
+            return 0, 0
+        videos, documents = _read_events(paths)
+        video_rows, _ = upsert_video_heartbeats(videos)
+        document_rows, _ = upsert_document_reads(documents)
+        for path in paths:
+            os.remove(path)
+        _clear_overlay({VIDEO: videos, DOCUMENT: documents})
+    return len(video_rows), len(document_rows)
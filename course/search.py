@@ -0,0 +1,139 @@
+"""Full-text search over course titles, descriptions and tag names.
+
+The index lives outside the ORM in a ``course_search`` table created by
+migration 0006: an FTS5 virtual table on SQLite, and a table with a stored
+``tsvector`` column and a GIN index on PostgreSQL. Other databases fall back
+to ``icontains`` matching without ranking. Rows are refreshed by the receivers
+in ``course.signals``; ``rebuild_course_search`` repopulates the whole index.
+"""
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Course
+
+TABLE = 'course_search'
+
+# Private-use characters mark highlighted terms until the snippet is escaped.
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+SNIPPET_WORDS = 24
+
+POSTGRES_CONFIG = 'simple'
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def search_terms(query):
+    """Words of a user query; each is matched as a prefix and all must match."""
+    return re.findall(r'\w+', query.lower())[:16]
+
+
+def _documents(course_ids):
+    courses = Course.objects.filter(pk__in=course_ids).only('title', 'description').prefetch_related('tags')
+    return [
+        (course.pk, course.title, ' '.join(tag.name for tag in course.tags.all()), course.description or '')
+        for course in courses
+    ]
+
+
+def index_courses(course_ids):
+    """(Re)index the given courses; ids without a course are removed."""
+    course_ids = list(course_ids)
+    if not course_ids or not is_supported():
+        return
+    rows = _documents(course_ids)
+    placeholders = ', '.join(['%s'] * len(course_ids))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', course_ids)
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, title, tags, description) VALUES (%s, %s, %s, %s)', rows,
+            )
+        else:
+            indexed = {row[0] for row in rows}
+            stale = [pk for pk in course_ids if pk not in indexed]
+            if stale:
+                cursor.execute(f'DELETE FROM {TABLE} WHERE course_id = ANY(%s)', [stale])
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (course_id, title, tags, description) VALUES (%s, %s, %s, %s) '
+                'ON CONFLICT (course_id) DO UPDATE SET title = EXCLUDED.title, '
+                'tags = EXCLUDED.tags, description = EXCLUDED.description',
+                rows,
+            )
+
+
+def remove_courses(course_ids):
+    course_ids = list(course_ids)
+    if not course_ids or connection.vendor != 'sqlite':
+        # PostgreSQL rows go with the course through ON DELETE CASCADE.
+        return
+    placeholders = ', '.join(['%s'] * len(course_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', course_ids)
+
+
+def rebuild(batch_size=500):
+    """Drop every indexed row and index all courses again; returns the count."""
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        index_courses(ids[start:start + batch_size])
+    return len(ids)
+
+
+def highlight(snippet):
+    """HTML-escape a snippet and wrap matched terms in ``<mark>``."""
+    escaped = html.escape(snippet or '')
+    return escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search(query, limit=20, published_only=True):
+    """Return ``[(course_id, rank, snippet_html)]`` best match first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    published = 'AND c.ispublished' if published_only else ''
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            match = ' '.join(f'"{term}"*' for term in terms)
+            cursor.execute(
+                f"SELECT {TABLE}.rowid, bm25({TABLE}, 10.0, 5.0, 1.0) AS score, "
+                f"snippet({TABLE}, -1, %s, %s, '…', %s) "
+                f"FROM {TABLE} JOIN course_course c ON c.id = {TABLE}.rowid "
+                f"WHERE {TABLE} MATCH %s {published} ORDER BY score LIMIT %s",
+                [MARK_START, MARK_END, SNIPPET_WORDS, match, limit],
+            )
+            # bm25() is lower-is-better; expose a higher-is-better rank.
+            return [(pk, round(-score, 4), highlight(snippet)) for pk, score, snippet in cursor.fetchall()]
+        if connection.vendor == 'postgresql':
+            tsquery = ' & '.join(f'{term}:*' for term in terms)
+            cursor.execute(
+                f"SELECT s.course_id, ts_rank_cd(s.document, q) AS score, "
+                f"ts_headline(%s, s.title || ' — ' || s.description, q, %s) "
+                f"FROM {TABLE} s JOIN course_course c ON c.id = s.course_id, to_tsquery(%s, %s) q "
+                f"WHERE s.document @@ q {published} ORDER BY score DESC LIMIT %s",
+                [
+                    POSTGRES_CONFIG,
+                    f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_WORDS}, MinWords=8',
+                    POSTGRES_CONFIG, tsquery, limit,
+                ],
+            )
+            return [(pk, round(score, 4), highlight(snippet)) for pk, score, snippet in cursor.fetchall()]
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(description__icontains=term) | Q(tags__name__icontains=term)
+    courses = Course.objects.filter(condition)
+    if published_only:
+        courses = courses.filter(ispublished=True)
+    rows = courses.distinct().order_by('-created_at').values_list('pk', 'description')[:limit]
+    return [(pk, 0, html.escape(' '.join((description or '').split()[:SNIPPET_WORDS]))) for pk, description in rows]
@@ -1,7 +1,8 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import (
     Course, Module, Video, Document, Quiz, Question, Answer, Enrollment,
-    VideoProgress, DocumentProgress, QuizAttempt, ModuleProgress, FAQ, Tags, CourseReview,
+    VideoProgress, DocumentProgress, QuizAttempt, QuestionResult, ModuleProgress, FAQ, Tags, CourseReview,
 )
 from django.contrib.auth import get_user_model
 
@@ -60,6 +61,30 @@ class QuizSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+# Learner-facing quiz tree for delivery; never exposes is_correct.
+
+class DeliveryAnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Answer
+        fields = ['id', 'text']
+
+
+class DeliveryQuestionSerializer(serializers.ModelSerializer):
+    answers = DeliveryAnswerSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Question
+        fields = ['id', 'text', 'answers']
+
+
+class QuizDeliverySerializer(serializers.ModelSerializer):
+    questions = DeliveryQuestionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Quiz
+        fields = ['id', 'title', 'version', 'questions']
+
+
 class VideoSerializer(serializers.ModelSerializer):
     video_url = serializers.URLField(source='url')
 
@@ -133,13 +158,9 @@ class CourseSerializer(serializers.ModelSerializer):
     discount_percentage = serializers.SerializerMethodField()
     discount_deadline = serializers.SerializerMethodField()
     is_featured = serializers.SerializerMethodField()
-    total_modules = serializers.SerializerMethodField()
-    total_videos = serializers.SerializerMethodField()
-    total_documents = serializers.SerializerMethodField()
-    total_quizzes = serializers.SerializerMethodField()
-    reviews = serializers.SerializerMethodField()
-    rating = serializers.SerializerMethodField()
-    student = serializers.SerializerMethodField()
+    reviews = serializers.IntegerField(source='rating_count', read_only=True)
+    rating = serializers.FloatField(source='average_rating', read_only=True)
+    student = serializers.IntegerField(source='total_students', read_only=True)
 
     class Meta:
         model = Course
@@ -156,6 +177,52 @@ class CourseSerializer(serializers.ModelSerializer):
             'modules', 'reviews', 'rating', 'student',
         ]
 
+    # Nested relations, returned by default only when ``?fields=`` and
+    # ``?expand=`` are both absent.
+    EXPANDABLE_FIELDS = ('instructor', 'modules', 'faqs', 'tags')
+
+    # Prefetches each field needs to render without per-row queries.
+    FIELD_PREFETCHES = {
+        'modules': (
+            'modules__videos', 'modules__documents', 'modules__quizzes__questions__answers',
+        ),
+        'faqs': (
+            Prefetch('faqs', queryset=FAQ.objects.select_related('is_asked_by', 'is_answered_by')),
+        ),
+        'tags': ('tags',),
+    }
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('course_fields')
+        if requested:
+            for name in set(fields) - set(requested):
+                fields.pop(name)
+        return fields
+
+    @classmethod
+    def base_fields(cls):
+        """The course's own fields, without nested relations."""
+        return [name for name in cls.Meta.fields if name not in cls.EXPANDABLE_FIELDS]
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, prefix=''):
+        """Load only the relations needed to render ``fields`` (all when None)."""
+        wanted = set(fields) if fields else set(cls.Meta.fields)
+        if 'instructor' in wanted:
+            queryset = queryset.select_related(f'{prefix}instructor')
+        lookups = {}
+        for name in cls.Meta.fields:
+            if name not in wanted:
+                continue
+            for lookup in cls.FIELD_PREFETCHES.get(name, ()):
+                if isinstance(lookup, Prefetch):
+                    lookup = Prefetch(f'{prefix}{lookup.prefetch_through}', queryset=lookup.queryset)
+                    lookups.setdefault(lookup.prefetch_through, lookup)
+                else:
+                    lookups.setdefault(f'{prefix}{lookup}', f'{prefix}{lookup}')
+        return queryset.prefetch_related(*lookups.values())
+
     def get_cover(self, obj):
         return None
 
@@ -168,30 +235,6 @@ class CourseSerializer(serializers.ModelSerializer):
     def get_is_featured(self, obj):
         return False
 
-    def get_total_modules(self, obj):
-        return obj.modules.count()
-
-    def get_total_videos(self, obj):
-        return sum(m.videos.count() for m in obj.modules.all())
-
-    def get_total_documents(self, obj):
-        return sum(m.documents.count() for m in obj.modules.all())
-
-    def get_total_quizzes(self, obj):
-        return sum(m.quizzes.count() for m in obj.modules.all())
-
-    def get_reviews(self, obj):
-        return obj.reviews.filter(visible=True).count()
-
-    def get_rating(self, obj):
-        visible = obj.reviews.filter(visible=True)
-        if not visible.exists():
-            return 0
-        return round(sum(r.rating for r in visible) / visible.count(), 1)
-
-    def get_student(self, obj):
-        return obj.enrollments.count()
-
     def create(self, validated_data):
         faqs_data = validated_data.pop('faqs', [])
         tags_data = validated_data.pop('tags', [])
@@ -208,6 +251,68 @@ class CourseSerializer(serializers.ModelSerializer):
         return course
 
 
+# Write-only serializers validating a whole curriculum tree before import.
+# Errors come back nested by position, e.g. modules[3].quizzes[0].questions[2].
+
+class CurriculumAnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Answer
+        fields = ['text', 'is_correct']
+
+
+class CurriculumQuestionSerializer(serializers.ModelSerializer):
+    answers = CurriculumAnswerSerializer(many=True, default=list)
+
+    class Meta:
+        model = Question
+        fields = ['text', 'answers']
+
+
+class CurriculumQuizSerializer(serializers.ModelSerializer):
+    questions = CurriculumQuestionSerializer(many=True, default=list)
+
+    class Meta:
+        model = Quiz
+        fields = ['title', 'questions']
+
+
+class CurriculumVideoSerializer(serializers.ModelSerializer):
+    video_url = serializers.URLField(source='url')
+
+    class Meta:
+        model = Video
+        fields = ['title', 'video_url', 'duration']
+
+
+class CurriculumDocumentSerializer(serializers.ModelSerializer):
+    # Storage path of an already uploaded file; JSON imports cannot carry files.
+    document_file = serializers.CharField(source='file', max_length=100)
+
+    class Meta:
+        model = Document
+        fields = ['title', 'document_file']
+
+
+class CurriculumModuleSerializer(serializers.ModelSerializer):
+    videos = CurriculumVideoSerializer(many=True, default=list)
+    documents = CurriculumDocumentSerializer(many=True, default=list)
+    quizzes = CurriculumQuizSerializer(many=True, default=list)
+
+    class Meta:
+        model = Module
+        fields = ['title', 'order', 'videos', 'documents', 'quizzes']
+
+
+class CurriculumSerializer(serializers.Serializer):
+    modules = CurriculumModuleSerializer(many=True, allow_empty=False)
+
+
+class ModuleBulkCreateSerializer(serializers.Serializer):
+    # Each module is validated by ModuleSerializer once the course is known.
+    course = serializers.PrimaryKeyRelatedField(queryset=Course.objects.all())
+    modules = serializers.ListField(child=serializers.DictField(), default=list)
+
+
 class EnrollmentSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     course = CourseSerializer(read_only=True)
@@ -230,6 +335,37 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         return None
 
 
+class CourseSummarySerializer(serializers.ModelSerializer):
+    instructor = UserSerializer(read_only=True)
+    price = serializers.DecimalField(source='final_price', max_digits=10, decimal_places=2, read_only=True)
+    rating = serializers.FloatField(source='average_rating', read_only=True)
+
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'title', 'slug', 'instructor', 'price', 'rating',
+            'total_modules', 'total_videos', 'total_documents', 'total_quizzes',
+        ]
+        read_only_fields = fields
+
+
+class LearnerEnrollmentSerializer(EnrollmentSerializer):
+    """Enrollment with a compact course and the progress computed by ``course.dashboard``."""
+    course = CourseSummarySerializer(read_only=True)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Enrollment
+        fields = [
+            'id', 'course', 'enrolled_at', 'completion_percentage', 'is_completed',
+            'started_at', 'last_accessed_module', 'certificate_issued', 'progress',
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        return self.context['progress'][obj.course_id]
+
+
 class VideoProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = VideoProgress
@@ -237,6 +373,21 @@ class VideoProgressSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class VideoHeartbeatSerializer(serializers.Serializer):
+    video = serializers.IntegerField()
+    watched_duration = serializers.IntegerField(min_value=0)
+    is_completed = serializers.BooleanField(default=False)
+
+
+class VideoHeartbeatBatchSerializer(serializers.Serializer):
+    events = VideoHeartbeatSerializer(many=True, allow_empty=False, max_length=500)
+
+
+class DocumentReadSerializer(serializers.Serializer):
+    document = serializers.IntegerField()
+    read = serializers.BooleanField(default=True)
+
+
 class DocumentProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = DocumentProgress
@@ -244,11 +395,32 @@ class DocumentProgressSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'read_at']
 
 
+class QuestionResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuestionResult
+        fields = ['question', 'selected_answers', 'is_correct']
+        read_only_fields = fields
+
+
 class QuizAttemptSerializer(serializers.ModelSerializer):
+    results = QuestionResultSerializer(many=True, read_only=True)
+
     class Meta:
         model = QuizAttempt
-        fields = ['id', 'quiz', 'score', 'attempt_date']
-        read_only_fields = ['id', 'attempt_date']
+        fields = ['id', 'quiz', 'score', 'correct_count', 'question_count', 'attempt_date', 'results']
+        read_only_fields = fields
+
+
+class QuizSubmissionSerializer(serializers.Serializer):
+    answers = serializers.ListField(child=serializers.IntegerField(), max_length=1000)
+
+
+class QuizGradeSubmissionSerializer(QuizSubmissionSerializer):
+    user = serializers.IntegerField()
+
+
+class QuizBatchGradeSerializer(serializers.Serializer):
+    submissions = QuizGradeSubmissionSerializer(many=True, allow_empty=False, max_length=1000)
 
 
 class ModuleProgressSerializer(serializers.ModelSerializer):
@@ -258,8 +430,20 @@ class ModuleProgressSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class CourseRatingSerializer(serializers.ModelSerializer):
+    course = serializers.SlugField(source='slug', read_only=True)
+    count = serializers.IntegerField(source='rating_count', read_only=True)
+    average = serializers.FloatField(source='average_rating', read_only=True)
+    histogram = serializers.DictField(source='rating_histogram', child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ['course', 'count', 'average', 'histogram']
+
+
 class CourseReviewSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    rating = serializers.IntegerField(min_value=1, max_value=5)
 
     class Meta:
         model = CourseReview
@@ -0,0 +1,224 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import search
+from .counters import CONTENT_COUNTERS, adjust_course_counters, adjust_module_counters, apply_review_change
+from .models import (
+    FAQ, Answer, Course, CourseReview, Document, DocumentProgress, Enrollment, Module, Question, Quiz,
+    QuizAttempt, Tags, Video, VideoProgress,
+)
+from .progress import record_progress, refresh_completion
+
+# How to reach the owning course from each piece of course content. Lookups go
+# through the parent rows, so updates never need to load them first.
+COURSE_LOOKUPS = {
+    Module: lambda instance: {'pk': instance.course_id},
+    Video: lambda instance: {'modules': instance.module_id},
+    Document: lambda instance: {'modules': instance.module_id},
+    Quiz: lambda instance: {'modules': instance.module_id},
+    Question: lambda instance: {'modules__quizzes': instance.quiz_id},
+    Answer: lambda instance: {'modules__quizzes__questions': instance.question_id},
+    FAQ: lambda instance: {'pk': instance.course_id},
+    Tags: lambda instance: {'tags': instance.pk},
+    CourseReview: lambda instance: {'pk': instance.course_id},
+}
+
+COURSE_COUNTERS = {Module: 'total_modules', **CONTENT_COUNTERS}
+
+
+def content_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = {'content_version': 1}
+    if created and sender in COURSE_COUNTERS:
+        deltas[COURSE_COUNTERS[sender]] = 1
+        if sender in CONTENT_COUNTERS:
+            adjust_module_counters({CONTENT_COUNTERS[sender]: 1}, pk=instance.module_id)
+    adjust_course_counters(deltas, **COURSE_LOOKUPS[sender](instance))
+    if created and sender in CONTENT_COUNTERS:
+        refresh_completion([instance.module_id])
+
+
+def content_deleted(sender, instance, **kwargs):
+    deltas = {'content_version': 1}
+    if sender in COURSE_COUNTERS:
+        deltas[COURSE_COUNTERS[sender]] = -1
+        if sender in CONTENT_COUNTERS:
+            adjust_module_counters({CONTENT_COUNTERS[sender]: -1}, pk=instance.module_id)
+    adjust_course_counters(deltas, **COURSE_LOOKUPS[sender](instance))
+    if sender in CONTENT_COUNTERS:
+        refresh_completion([instance.module_id])
+
+
+for model in COURSE_LOOKUPS:
+    post_save.connect(content_saved, sender=model, dispatch_uid=f'course_content_{model.__name__}_saved')
+    if model is not Tags:
+        post_delete.connect(content_deleted, sender=model, dispatch_uid=f'course_content_{model.__name__}_deleted')
+
+
+# Questions and answers bump their quiz's version, which keys the compiled
+# answer key used for grading and the cached delivery payload.
+QUIZ_LOOKUPS = {
+    Question: lambda instance: {'pk': instance.quiz_id},
+    Answer: lambda instance: {'questions': instance.question_id},
+}
+
+
+def quiz_content_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Quiz.objects.filter(**QUIZ_LOOKUPS[sender](instance)).update(version=F('version') + 1)
+
+
+for model in QUIZ_LOOKUPS:
+    post_save.connect(quiz_content_changed, sender=model, dispatch_uid=f'course_quiz_{model.__name__}_saved')
+    post_delete.connect(quiz_content_changed, sender=model, dispatch_uid=f'course_quiz_{model.__name__}_deleted')
+
+
+@receiver(post_save, sender=Quiz)
+def quiz_saved(sender, instance, created, raw=False, **kwargs):
+    # The delivery payload also carries the quiz's own fields.
+    if not created and not raw:
+        Quiz.objects.filter(pk=instance.pk).update(version=F('version') + 1)
+
+
+@receiver(pre_delete, sender=Tags)
+def tag_deleted(sender, instance, **kwargs):
+    # The tag's course links are gone by post_delete.
+    adjust_course_counters({'content_version': 1}, tags=instance.pk)
+
+
+@receiver(m2m_changed, sender=Tags.courses.through)
+def tag_courses_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if isinstance(instance, Course):
+        adjust_course_counters({'content_version': 1}, pk=instance.pk)
+    elif action == 'pre_clear':
+        adjust_course_counters({'content_version': 1}, tags=instance.pk)
+    elif pk_set:
+        adjust_course_counters({'content_version': 1}, pk__in=pk_set)
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        adjust_course_counters({'content_version': 1}, pk=instance.pk)
+
+
+@receiver(post_save, sender=Course)
+def index_saved_course(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_courses([instance.pk])
+
+
+@receiver(post_delete, sender=Course)
+def unindex_deleted_course(sender, instance, **kwargs):
+    search.remove_courses([instance.pk])
+
+
+@receiver(post_save, sender=Tags)
+def index_renamed_tag(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_courses(instance.courses.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tags)
+def remember_tagged_courses(sender, instance, **kwargs):
+    instance.search_course_ids = list(instance.courses.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tags)
+def index_untagged_courses(sender, instance, **kwargs):
+    search.index_courses(getattr(instance, 'search_course_ids', ()))
+
+
+@receiver(m2m_changed, sender=Tags.courses.through)
+def index_retagged_courses(sender, instance, action, pk_set, **kwargs):
+    if isinstance(instance, Course):
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_courses([instance.pk])
+    elif action == 'pre_clear':
+        instance.search_course_ids = list(instance.courses.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.index_courses(getattr(instance, 'search_course_ids', ()))
+    elif action in ('post_add', 'post_remove'):
+        search.index_courses(pk_set or ())
+
+
+# The student count is part of the cached course detail, so enrollments also
+# move its content version.
+@receiver(post_save, sender=Enrollment)
+def enrollment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        adjust_course_counters({'total_students': 1, 'content_version': 1}, pk=instance.course_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    adjust_course_counters({'total_students': -1, 'content_version': 1}, pk=instance.course_id)
+
+
+@receiver(post_save, sender=CourseReview)
+def review_saved(sender, instance, raw=False, **kwargs):
+    change = instance.__dict__.pop('rating_change', None)
+    if not raw and change is not None:
+        apply_review_change(*change)
+
+
+@receiver(post_delete, sender=CourseReview)
+def review_deleted(sender, instance, **kwargs):
+    # Reviews deleted through a cascade never went through ``delete``; their
+    # values were just read by the collector.
+    change = instance.__dict__.pop('rating_change', None)
+    if change is None:
+        change = ((instance.course_id, instance.visible, instance.rating), None)
+    if change[0] is not None:
+        apply_review_change(*change)
+
+
+# How to reach the module of each tracked item.
+PROGRESS_ITEMS = {
+    VideoProgress: lambda instance: {'videos': instance.video_id},
+    DocumentProgress: lambda instance: {'documents': instance.document_id},
+}
+
+
+def item_progress_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    record_progress(instance.user_id, PROGRESS_ITEMS[sender](instance), instance.completion_delta or 0)
+
+
+def item_progress_deleted(sender, instance, **kwargs):
+    # Rows deleted through a cascade never went through ``delete``; their
+    # flag was just read by the collector.
+    delta = instance.completion_delta
+    if delta is None:
+        delta = -int(getattr(instance, instance.completion_field))
+    if delta:
+        record_progress(instance.user_id, PROGRESS_ITEMS[sender](instance), delta, touch=False)
+
+
+for model in PROGRESS_ITEMS:
+    post_save.connect(item_progress_saved, sender=model, dispatch_uid=f'course_progress_{model.__name__}_saved')
+    post_delete.connect(item_progress_deleted, sender=model, dispatch_uid=f'course_progress_{model.__name__}_deleted')
+
+
+def _other_attempts(instance):
+    return QuizAttempt.objects.filter(user_id=instance.user_id, quiz_id=instance.quiz_id).exclude(pk=instance.pk)
+
+
+@receiver(post_save, sender=QuizAttempt)
+def quiz_attempted(sender, instance, created, raw=False, **kwargs):
+    # A quiz counts as completed from the learner's first attempt.
+    if raw:
+        return
+    first = created and not _other_attempts(instance).exists()
+    record_progress(instance.user_id, {'quizzes': instance.quiz_id}, int(first))
+
+
+@receiver(post_delete, sender=QuizAttempt)
+def quiz_attempt_deleted(sender, instance, **kwargs):
+    if not _other_attempts(instance).exists():
+        record_progress(instance.user_id, {'quizzes': instance.quiz_id}, -1, touch=False)
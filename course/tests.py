@@ -1,3 +1,487 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from . import grading, progress, progress_buffer, search
+from .models import (
+    Answer, Course, CourseReview, Document, DocumentProgress, Enrollment, Module, Question, Quiz, QuizAttempt, Tags,
+    Video, VideoProgress,
+)
+
+User = get_user_model()
+
+class CounterTests(TestCase):
+    RATING_FIELDS = ['rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+    def setUp(self):
+        self.instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.learner = User.objects.create_user(email='learner@example.com', password='testpass123')
+        self.course = Course.objects.create(title='Course', instructor=self.instructor)
+
+    def ratings(self):
+        return list(Course.objects.filter(pk=self.course.pk).values_list(*self.RATING_FIELDS).get())
+
+    def test_content_and_student_counters(self):
+        module = Module.objects.create(course=self.course, title='Module')
+        video = Video.objects.create(module=module, title='Video', url='https://example.com/v.mp4')
+        enrollment = Enrollment.objects.create(user=self.learner, course=self.course)
+        self.course.refresh_from_db()
+        module.refresh_from_db()
+        self.assertEqual((self.course.total_modules, self.course.total_videos, self.course.total_students), (1, 1, 1))
+        self.assertEqual(module.total_videos, 1)
+
+        video.delete()
+        enrollment.delete()
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.total_modules, self.course.total_videos, self.course.total_students), (1, 0, 0))
+
+    def test_review_counters(self):
+        review = CourseReview.objects.create(course=self.course, user=self.learner, visible=True, rating=3)
+        self.assertEqual(self.ratings(), [1, 3, 0, 0, 1, 0, 0])
+
+        stale = CourseReview.objects.get(pk=review.pk)
+        review.rating = 5
+        review.save()
+        self.assertEqual(self.ratings(), [1, 5, 0, 0, 0, 0, 1])
+
+        # Saved from an outdated copy: moves the stored rating (5), not the one it loaded (3).
+        stale.visible = False
+        stale.save()
+        self.assertEqual(self.ratings(), [0, 0, 0, 0, 0, 0, 0])
+
+        # ``review`` still holds visible=True, rating=5.
+        review.save(update_fields=['comment'])
+        review.delete()
+        self.assertEqual(self.ratings(), [0, 0, 0, 0, 0, 0, 0])
+
+    def test_review_removed_with_user(self):
+        CourseReview.objects.create(course=self.course, user=self.learner, visible=True, rating=4)
+        self.learner.delete()
+        self.assertEqual(self.ratings(), [0, 0, 0, 0, 0, 0, 0])
+
+class ProgressTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.learner = User.objects.create_user(email='learner@example.com', password='testpass123')
+        self.course = Course.objects.create(title='Course', instructor=self.instructor)
+        self.module = Module.objects.create(course=self.course, title='Module')
+        self.videos = [
+            Video.objects.create(module=self.module, title=f'Video {n}', url='https://example.com/v.mp4')
+            for n in range(4)
+        ]
+        self.enrollment = Enrollment.objects.create(user=self.learner, course=self.course)
+
+    def progress(self, video):
+        return VideoProgress.objects.get_or_create(user=self.learner, video=video)[0]
+
+    def assertCompleted(self, items, percentage):
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_items, items)
+        self.assertEqual(self.enrollment.completion_percentage, percentage)
+
+    def test_completion_counts_once(self):
+        self.progress(self.videos[0])
+        first = VideoProgress.objects.get(video=self.videos[0])
+        stale = VideoProgress.objects.get(video=self.videos[0])
+        first.is_completed = True
+        first.save()
+        stale.is_completed = True
+        stale.save()
+        progress = self.progress(self.videos[1])
+        progress.is_completed = True
+        progress.save()
+        self.assertCompleted(2, 50.0)
+
+    def test_uncomplete_and_delete(self):
+        progress = self.progress(self.videos[0])
+        progress.is_completed = True
+        progress.save()
+        progress.is_completed = False
+        progress.save()
+        self.assertCompleted(0, 0.0)
+
+        progress.is_completed = True
+        progress.save()
+        stale = VideoProgress.objects.get(pk=progress.pk)
+        progress.delete()
+        stale.delete()
+        self.assertCompleted(0, 0.0)
+
+    def test_course_completed(self):
+        for video in self.videos:
+            progress = self.progress(video)
+            progress.is_completed = True
+            progress.save()
+        self.assertCompleted(4, 100.0)
+        self.assertTrue(self.enrollment.is_completed)
+        self.assertTrue(self.enrollment.module_progress.get().completed)
+
+class BatchProgressTests(APITestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.learner = User.objects.create_user(email='learner@example.com', password='testpass123')
+        course = Course.objects.create(title='Course', instructor=instructor)
+        module = Module.objects.create(course=course, title='Module')
+        self.videos = [
+            Video.objects.create(module=module, title=f'Video {n}', url='https://example.com/v.mp4') for n in range(2)
+        ]
+        self.document = Document.objects.create(module=module, title='Document', file='doc.pdf')
+        self.enrollment = Enrollment.objects.create(user=self.learner, course=course)
+        self.client.force_authenticate(self.learner)
+
+    def post(self, events):
+        response = self.client.post('/api/v1/course/videos/progress/', {'events': events}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def completed_items(self):
+        self.enrollment.refresh_from_db()
+        return self.enrollment.completed_items
+
+    def test_batch_upserts_and_never_goes_back(self):
+        first, second = self.videos
+        data = self.post([
+            {'video': first.pk, 'watched_duration': 30, 'is_completed': False},
+            {'video': first.pk, 'watched_duration': 90, 'is_completed': True},
+            {'video': second.pk, 'watched_duration': 10, 'is_completed': False},
+            {'video': 999, 'watched_duration': 10, 'is_completed': False},
+        ])
+        self.assertEqual(data['progress'], [
+            {'video': first.pk, 'watched_duration': 90, 'is_completed': True},
+            {'video': second.pk, 'watched_duration': 10, 'is_completed': False},
+        ])
+        self.assertEqual(data['unknown_videos'], [999])
+        self.assertEqual(self.completed_items(), 1)
+
+        data = self.post([{'video': first.pk, 'watched_duration': 5, 'is_completed': False}])
+        self.assertEqual(data['progress'], [{'video': first.pk, 'watched_duration': 90, 'is_completed': True}])
+        self.assertEqual(self.completed_items(), 1)
+
+    def test_concurrent_batch_is_not_counted_twice(self):
+        video = self.videos[0]
+        bulk_create = VideoProgress.objects.bulk_create
+        raced = []
+
+        def racing(*args, **kwargs):
+            # Another batch lands between this one's reads and its writes.
+            if not raced:
+                raced.append(True)
+                progress.record_video_heartbeats(self.learner.pk, [
+                    {'video': video.pk, 'watched_duration': 500, 'is_completed': True},
+                ])
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(VideoProgress.objects, 'bulk_create', side_effect=racing):
+            self.post([{'video': video.pk, 'watched_duration': 100, 'is_completed': True}])
+        self.assertEqual(VideoProgress.objects.get(video=video).watched_duration, 500)
+        self.assertEqual(self.completed_items(), 1)
+
+    def test_document_reads(self):
+        now = timezone.now()
+        rows, unknown = progress.upsert_document_reads({self.learner.pk: [
+            {'document': self.document.pk, 'read': True, 'read_at': now},
+            {'document': self.document.pk, 'read': True, 'read_at': now - timedelta(hours=1)},
+            {'document': 999, 'read': True, 'read_at': now},
+        ]})
+        self.assertEqual(unknown, [999])
+        self.assertEqual([(row.read, row.read_at) for row in rows], [(True, now - timedelta(hours=1))])
+        progress.upsert_document_reads({self.learner.pk: [
+            {'document': self.document.pk, 'read': True, 'read_at': now - timedelta(days=1)},
+        ]})
+        self.assertEqual(DocumentProgress.objects.get().read_at, now - timedelta(hours=1))
+        self.assertEqual(self.completed_items(), 1)
+
+class ProgressBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        settings = override_settings(PROGRESS_WRITE_BEHIND=True, PROGRESS_SPOOL_DIR=spool.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.learner = User.objects.create_user(email='learner@example.com', password='testpass123')
+        course = Course.objects.create(title='Course', instructor=instructor)
+        module = Module.objects.create(course=course, title='Module')
+        self.video = Video.objects.create(module=module, title='Video', url='https://example.com/v.mp4')
+        self.enrollment = Enrollment.objects.create(user=self.learner, course=course)
+
+    def append(self, duration, completed=False):
+        return progress_buffer.append(self.learner.pk, progress_buffer.VIDEO, [
+            {'video': self.video.pk, 'watched_duration': duration, 'is_completed': completed},
+        ])
+
+    def read_back(self, stored=None):
+        return progress_buffer.read_back(self.learner.pk, progress_buffer.VIDEO, {self.video.pk}, stored or {})
+
+    def test_append_and_read_back(self):
+        self.append(60, completed=True)
+        self.assertEqual(self.append(30), {self.video.pk: {'watched_duration': 60, 'is_completed': True}})
+        self.assertFalse(VideoProgress.objects.exists())
+        stored = {self.video.pk: {'watched_duration': 90, 'is_completed': False}}
+        self.assertEqual(self.read_back(stored), {self.video.pk: {'watched_duration': 90, 'is_completed': True}})
+
+    def test_flush_writes_and_clears_overlay(self):
+        self.append(60, completed=True)
+        self.assertEqual(progress_buffer.flush(), (1, 0))
+        row = VideoProgress.objects.get()
+        self.assertEqual((row.watched_duration, row.is_completed), (60, True))
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_items, 1)
+        self.assertIsNone(cache.get(progress_buffer._overlay_key(self.learner.pk)))
+        self.assertEqual(progress_buffer.flush(), (0, 0))
+
+    def test_overlay_keeps_values_appended_during_flush(self):
+        self.append(60)
+        upsert = progress_buffer.upsert_video_heartbeats
+
+        def upsert_then_append(events):
+            rows = upsert(events)
+            self.append(120)
+            return rows
+
+        with mock.patch.object(progress_buffer, 'upsert_video_heartbeats', side_effect=upsert_then_append):
+            progress_buffer.flush()
+        self.assertEqual(self.read_back(), {self.video.pk: {'watched_duration': 120, 'is_completed': False}})
+        self.assertEqual(progress_buffer.flush(), (1, 0))
+        self.assertEqual(VideoProgress.objects.get().watched_duration, 120)
+
+    def test_failed_flush_is_replayed(self):
+        self.append(60)
+        with mock.patch.object(progress_buffer, 'upsert_video_heartbeats', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                progress_buffer.flush()
+        self.append(90)
+        self.assertEqual(progress_buffer.flush(), (1, 0))
+        self.assertEqual(VideoProgress.objects.get().watched_duration, 90)
+        self.assertEqual(progress_buffer.claim(), [])
+
+class GradingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        grading._compiled.clear()
+        self.admin = User.objects.create_user(email='admin@example.com', password='testpass123', is_staff=True)
+        self.learner = User.objects.create_user(email='learner@example.com', password='testpass123')
+        course = Course.objects.create(title='Course', instructor=self.admin)
+        module = Module.objects.create(course=course, title='Module')
+        self.quiz = Quiz.objects.create(module=module, title='Quiz')
+        single = Question.objects.create(quiz=self.quiz, text='Single')
+        self.right = Answer.objects.create(question=single, text='Right', is_correct=True)
+        self.wrong = Answer.objects.create(question=single, text='Wrong')
+        multi = Question.objects.create(quiz=self.quiz, text='Multi')
+        self.multi = [
+            Answer.objects.create(question=multi, text='A', is_correct=True),
+            Answer.objects.create(question=multi, text='B', is_correct=True),
+            Answer.objects.create(question=multi, text='C'),
+        ]
+        Enrollment.objects.create(user=self.learner, course=course)
+        self.client.force_authenticate(self.learner)
+
+    def attempt(self, answers):
+        return self.client.post(f'/api/v1/course/quizzes/{self.quiz.pk}/attempt/', {'answers': answers}, format='json')
+
+    def test_correct_answers(self):
+        response = self.attempt([self.right.pk, self.multi[0].pk, self.multi[1].pk])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        attempt = QuizAttempt.objects.get(pk=response.data['id'])
+        self.assertEqual((attempt.correct_count, attempt.question_count, attempt.score), (2, 2, 100))
+        self.assertTrue(all(attempt.results.values_list('is_correct', flat=True)))
+
+    def test_incorrect_and_partial_answers(self):
+        cases = [
+            [self.wrong.pk, self.multi[0].pk],  # wrong single, missing one correct
+            [self.right.pk, self.wrong.pk, self.multi[0].pk, self.multi[1].pk, self.multi[2].pk],  # extras
+            [],
+        ]
+        for answers in cases:
+            response = self.attempt(answers)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(QuizAttempt.objects.get(pk=response.data['id']).correct_count, 0)
+
+    def test_foreign_answer_rejected(self):
+        other = Quiz.objects.create(module=self.quiz.module, title='Other')
+        foreign = Answer.objects.create(question=Question.objects.create(quiz=other, text='Q'), text='A', is_correct=True)
+        response = self.attempt([self.right.pk, foreign.pk])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+    def test_answer_change_invalidates_key(self):
+        answers = [self.wrong.pk, self.multi[0].pk, self.multi[1].pk]
+        self.assertEqual(QuizAttempt.objects.get(pk=self.attempt(answers).data['id']).correct_count, 1)
+        version = Quiz.objects.get(pk=self.quiz.pk).version
+
+        self.wrong.is_correct = True
+        self.wrong.save()
+        self.right.is_correct = False
+        self.right.save()
+        self.assertGreater(Quiz.objects.get(pk=self.quiz.pk).version, version)
+        self.assertEqual(QuizAttempt.objects.get(pk=self.attempt(answers).data['id']).correct_count, 2)
+
+        Answer.objects.create(question=self.multi[0].question, text='D', is_correct=True)
+        self.assertEqual(QuizAttempt.objects.get(pk=self.attempt(answers).data['id']).correct_count, 1)
+
+    def test_rename_refreshes_delivery(self):
+        deliver = f'/api/v1/course/quizzes/{self.quiz.pk}/deliver/'
+        self.assertEqual(self.client.get(deliver).data['title'], 'Quiz')
+        self.quiz.title = 'Renamed'
+        self.quiz.save()
+        self.assertEqual(self.client.get(deliver).data['title'], 'Renamed')
+
+    def test_batch_grade(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(f'/api/v1/course/quizzes/{self.quiz.pk}/grade/', {'submissions': [
+            {'user': self.learner.pk, 'answers': [self.right.pk, self.multi[0].pk, self.multi[1].pk]},
+            {'user': self.admin.pk, 'answers': [self.wrong.pk]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['correct_count'] for row in response.data], [2, 0])
+        enrollment = Enrollment.objects.get(user=self.learner)
+        self.assertEqual(enrollment.completed_items, 1)
+        self.assertTrue(enrollment.is_completed)
+
+class FieldsetTests(APITestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.course = Course.objects.create(title='Course', instructor=self.instructor, ispublished=True)
+        Module.objects.create(course=self.course, title='Module')
+
+    def get_course(self, query):
+        response = self.client.get(f'/api/v1/course/courses/{self.course.slug}/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_expand_without_fields(self):
+        data = self.get_course('expand=modules')
+        self.assertEqual([module['title'] for module in data['modules']], ['Module'])
+        self.assertIn('title', data)
+        self.assertNotIn('faqs', data)
+        self.assertNotIn('instructor', data)
+
+    def test_fields_and_expand(self):
+        self.assertEqual(set(self.get_course('fields=title,slug&expand=modules')), {'title', 'slug', 'modules'})
+        self.assertEqual(set(self.get_course('fields=title')), {'title'})
+
+    def test_full_course_by_default(self):
+        self.assertTrue({'modules', 'faqs', 'tags', 'instructor'} <= set(self.get_course('')))
+
+class CourseDetailCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.course = Course.objects.create(title='Course', instructor=self.instructor, ispublished=True)
+        self.url = f'/api/v1/course/courses/{self.course.slug}/'
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_edit_and_enrollment_change_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.course.title = 'Renamed'
+        self.course.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['title'], 'Renamed')
+
+        etag = response['ETag']
+        learner = User.objects.create_user(email='learner@example.com', password='testpass123')
+        enrollment = Enrollment.objects.create(user=learner, course=self.course)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['student'], 1)
+
+        enrollment.delete()
+        self.assertEqual(self.client.get(self.url).json()['student'], 0)
+
+class ModuleBulkCreateTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(email='admin@example.com', password='testpass123', is_staff=True)
+        self.course = Course.objects.create(title='Course', instructor=self.admin)
+        self.client.force_authenticate(self.admin)
+
+    def post(self, data):
+        return self.client.post('/api/v1/course/modules/bulk_create/', data, format='json')
+
+    def test_creates_modules(self):
+        response = self.post({'course': self.course.pk, 'modules': [{'title': 'One'}, {'title': 'Two', 'order': 1}]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(sorted(self.course.modules.values_list('title', flat=True)), ['One', 'Two'])
+
+    def test_invalid_payload(self):
+        for data in ({'course': 'abc'}, {'course': 999}, {}, {'course': self.course.pk, 'modules': 'x'}, [1]):
+            self.assertEqual(self.post(data).status_code, status.HTTP_400_BAD_REQUEST, data)
+        self.assertFalse(Module.objects.exists())
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.titled = Course.objects.create(
+            title='Python for Data Science', description='Pandas and notebooks.', instructor=instructor, ispublished=True,
+        )
+        self.described = Course.objects.create(
+            title='Analytics', description='Uses python <scripts> for reports.', instructor=instructor, ispublished=True,
+        )
+        self.draft = Course.objects.create(title='Python drafts', instructor=instructor)
+        # Unrelated courses, so the terms above are rare enough to rank.
+        for topic in ('Cooking', 'Gardening', 'Painting', 'Pottery', 'Sailing', 'Chess'):
+            Course.objects.create(title=topic, description=f'All about {topic.lower()}.', instructor=instructor)
+
+    def ids(self, query, **kwargs):
+        return [pk for pk, _, _ in search.search(query, **kwargs)]
+
+    def test_ranked_results_and_highlighting(self):
+        if not search.is_supported():
+            self.skipTest('No full-text index on this database.')
+        hits = search.search('pyth')
+        self.assertEqual([pk for pk, _, _ in hits], [self.titled.pk, self.described.pk])
+        self.assertGreater(hits[0][1], hits[1][1])
+        snippet = hits[1][2]
+        self.assertIn('<mark>python</mark>', snippet)
+        self.assertIn('&lt;scripts&gt;', snippet)
+        self.assertEqual(self.ids('python'), [self.titled.pk, self.described.pk])
+        self.assertIn(self.draft.pk, self.ids('python', published_only=False))
+        self.assertEqual(self.ids('python reports'), [self.described.pk])
+        self.assertEqual(self.ids('!!'), [])
+
+    def test_index_follows_updates_tags_and_deletes(self):
+        if not search.is_supported():
+            self.skipTest('No full-text index on this database.')
+        self.assertEqual(self.ids('rust'), [])
+        self.described.title = 'Rust analytics'
+        self.described.save()
+        self.assertEqual(self.ids('rust'), [self.described.pk])
+
+        tag = Tags.objects.create(name='machinelearning')
+        tag.courses.add(self.titled)
+        self.assertEqual(self.ids('machine'), [self.titled.pk])
+        tag.delete()
+        self.assertEqual(self.ids('machine'), [])
+
+        self.described.delete()
+        self.assertEqual(self.ids('rust'), [])
+        self.assertEqual(search.rebuild(), 8)
+        self.assertEqual(self.ids('python'), [self.titled.pk])
+
+    def test_icontains_fallback(self):
+        with mock.patch.object(search, 'connection', mock.MagicMock(vendor='mysql')):
+            hits = search.search('PYTHON scripts')
+        self.assertEqual(hits, [(self.described.pk, 0, 'Uses python &lt;scripts&gt; for reports.')])
+
+    def test_endpoint(self):
+        response = self.client.get('/api/v1/course/courses/search/', {'q': 'python', 'fields': 'id,title'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual({'id', 'title', 'rank', 'snippet'}, set(data['results'][0]))
+        self.assertEqual(self.client.get('/api/v1/course/courses/search/').status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,76 +1,139 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.pagination import CursorPagination
 from django.conf import settings
-from django.db.models import Prefetch
-from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
+import hashlib
+from django.contrib.auth import get_user_model
 import requests
-import uuid
 import logging
-import time
 
-from devangwa.request_utils import get_bearer_token
+from accounts import entitlements
+from devangwa.request_utils import get_bearer_token, get_query_list
+from payments import services as payments
+
+from . import search as course_search
+from .curriculum import import_curriculum
+from .dashboard import learner_dashboard
+from . import delivery, grading, progress_buffer
+from .progress import record_video_heartbeats
 
 from .models import Course, Module, Video, Document, Quiz, Question, Answer, Enrollment, VideoProgress, DocumentProgress, QuizAttempt, ModuleProgress, FAQ, Tags, CourseReview
 from .serializers import (
     CourseSerializer, ModuleSerializer, VideoSerializer, DocumentSerializer,
     QuizSerializer, QuestionSerializer, AnswerSerializer, EnrollmentSerializer,
     VideoProgressSerializer, DocumentProgressSerializer, QuizAttemptSerializer,
-    ModuleProgressSerializer, FAQSerializer, TagsSerializer, CourseReviewSerializer
+    ModuleProgressSerializer, FAQSerializer, TagsSerializer, CourseReviewSerializer,
+    CourseRatingSerializer, CurriculumSerializer, ModuleBulkCreateSerializer, LearnerEnrollmentSerializer, VideoHeartbeatBatchSerializer,
+    VideoHeartbeatSerializer, DocumentReadSerializer, QuizSubmissionSerializer, QuizBatchGradeSerializer,
 )
 
 logger = logging.getLogger(__name__)
 
+User = get_user_model()
+
+# Keyset pagination: each page seeks from the cursor position on an index
+# instead of counting/offsetting through earlier rows.
+class CourseCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+class EnrollmentCursorPagination(CourseCursorPagination):
+    ordering = ('-enrolled_at', '-id')
+
+def progress_scope(request, model, param, course_path):
+    """Ids of ``model`` rows named by ``?<param>=1,2`` or in ``?course=<id>``."""
+    try:
+        ids = [int(value) for value in get_query_list(request, param)]
+        course_id = int(request.query_params['course']) if 'course' in request.query_params else None
+    except ValueError:
+        raise ValidationError(f'{param} and course must be integer ids.')
+    if course_id is not None:
+        return list(model.objects.filter(**{course_path: course_id}).values_list('pk', flat=True))
+    if not ids:
+        raise ValidationError(f'Pass ?{param}=<ids> or ?course=<id>.')
+    return ids
+
 class CourseViewSet(viewsets.ModelViewSet):
-    queryset = Course.objects.all().prefetch_related(
-        'modules__videos', 'modules__documents', 'modules__quizzes',
-        'tags', 'faqs', 'instructor', 'reviews',
-    )
+    queryset = Course.objects.all()
     serializer_class = CourseSerializer
     lookup_field = "slug"
+    pagination_class = CourseCursorPagination
+
+    def get_fieldset(self, default=None):
+        """Fields requested via ``?fields=``/``?expand=``; None means the full course.
+
+        ``?expand=`` adds relations to ``?fields=`` or, without it, to
+        ``default`` (the course's own fields when that is None).
+        """
+        if self.request.method not in permissions.SAFE_METHODS:
+            return default
+        fields = get_query_list(self.request, 'fields')
+        expand = get_query_list(self.request, 'expand')
+        if not fields and not expand:
+            return default
+        return (fields or default or CourseSerializer.base_fields()) + expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['course_fields'] = self.get_fieldset()
+        return context
 
     def get_queryset(self):
         qs = super().get_queryset()
-        if self.action in ('list', 'retrieve') and not self.request.user.is_staff:
+        if self.action in ('list', 'retrieve', 'update', 'partial_update'):
+            qs = CourseSerializer.setup_eager_loading(qs, self.get_fieldset())
+        if self.action in ('list', 'retrieve', 'rating') and not self.request.user.is_staff:
             qs = qs.filter(ispublished=True)
         return qs
 
     def perform_create(self, serializer):
         serializer.save(instructor=self.request.user)
 
-    def process_payment(self, content_type_id, object_id, amount, payment_method, phone_number, card_number, auth_token):
-        max_attempts = 3
-        attempt = 1
-        while attempt <= max_attempts:
-            try:
-                response = requests.post(
-                    f"{settings.PAYMENTS_API_BASE_URL}/checkout/",
-                    json={
-                        'content_type_id': content_type_id,
-                        'object_id': object_id,
-                        'amount': float(amount),
-                        'payment_method': payment_method,
-                        'phone_number': phone_number,
-                        'card_number': card_number,
-                        'idempotency_key': str(uuid.uuid4())
-                    },
-                    headers={'Authorization': f'Bearer {auth_token}'}
-                )
-                response.raise_for_status()
-                return response.json()
-            except requests.RequestException as e:
-                logger.error(f"Payment attempt {attempt}/{max_attempts} failed: {str(e)}")
-                if attempt == max_attempts:
-                    raise
-                attempt += 1
-                time.sleep(1)  # Wait 1 second before retrying
+    def retrieve(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().retrieve(request, *args, **kwargs)
+
+        stamp = Course.objects.filter(slug=kwargs['slug'])
+        if not request.user.is_staff:
+            stamp = stamp.filter(ispublished=True)
+        version = stamp.values_list('content_version', flat=True).first()
+        if version is None:
+            raise Http404
+
+        fieldset = ','.join(sorted(set(self.get_fieldset() or ())))
+        cache_key = 'course-detail:{}:{}:{}'.format(
+            kwargs['slug'], version, hashlib.md5(fieldset.encode()).hexdigest(),
+        )
+        cached = cache.get(cache_key)
+        if cached is None:
+            serializer = self.get_serializer(self.get_object())
+            body = request.accepted_renderer.render(serializer.data, renderer_context=self.get_renderer_context())
+            cached = ('"{}"'.format(hashlib.sha1(body).hexdigest()), body)
+            cache.set(cache_key, cached, settings.COURSE_DETAIL_CACHE_TIMEOUT)
+
+        etag, body = cached
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type=request.accepted_renderer.media_type)
+        response['ETag'] = etag
+        return response
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def enroll(self, request, slug=None):
         course = self.get_object()
         user = request.user
 
+        # Checked against the table, not the entitlements cache: a stale
+        # answer here would charge the user twice.
         if Enrollment.objects.filter(user=user, course=course).exists():
             return Response({'detail': 'Already enrolled'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -83,44 +146,104 @@ class CourseViewSet(viewsets.ModelViewSet):
         phone_number = request.data.get('phone_number')
         card_number = request.data.get('card_number')
 
-        auth_token = get_bearer_token(request)
-        if not auth_token:
-            return Response({'detail': 'Authentication required for paid enrollment.'}, status=status.HTTP_401_UNAUTHORIZED)
-
         try:
-            content_type = ContentType.objects.get_for_model(Course)
-            payment_response = self.process_payment(
-                content_type_id=content_type.id,
-                object_id=course.id,
-                amount=course.final_price,
+            payment_response = payments.pay(
+                user, course, course.final_price,
                 payment_method=payment_method,
                 phone_number=phone_number,
                 card_number=card_number,
-                auth_token=auth_token,
+                auth_token=get_bearer_token(request),
             )
 
             if payment_response['status'] == 'succeeded':
-                enrollment = Enrollment.objects.create(user=user, course=course)
+                # The payment already granted access when it succeeded.
+                enrollment, _ = Enrollment.objects.get_or_create(user=user, course=course)
                 serializer = EnrollmentSerializer(enrollment)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
+            elif payment_response['status'] == 'pending':
+                # Still being charged; the enrollment is created when it succeeds.
+                return Response({
+                    'detail': 'Payment is being processed.',
+                    'order_tracking_id': payment_response['order_tracking_id'],
+                    'status': 'pending',
+                }, status=status.HTTP_202_ACCEPTED)
             else:
-                return Response({'detail': payment_response.get('detail', 'Payment failed')}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({'detail': payment_response.get('details', 'Payment failed')}, status=status.HTTP_400_BAD_REQUEST)
+        except APIException:
+            raise
         except requests.RequestException as e:
             return Response({'detail': f'Payment service error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
             logger.exception("Enroll error for course %s", slug)
             return Response({'detail': 'Enrollment failed. Please try again.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    # Default fields for search hits when ``?fields=`` is not given.
+    SEARCH_FIELDS = ['id', 'title', 'slug', 'description', 'price', 'instructor', 'tags', 'rating', 'reviews', 'student']
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'detail': 'Query parameter "q" is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 50))
+        except ValueError:
+            return Response({'detail': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        hits = course_search.search(query, limit=limit, published_only=not request.user.is_staff)
+        fields = self.get_fieldset(self.SEARCH_FIELDS)
+        courses = CourseSerializer.setup_eager_loading(Course.objects.filter(pk__in=[hit[0] for hit in hits]), fields)
+        courses = {course.pk: course for course in courses}
+        context = self.get_serializer_context()
+        context['course_fields'] = fields
+
+        results = []
+        for pk, rank, snippet in hits:
+            if pk not in courses:
+                continue
+            data = CourseSerializer(courses[pk], context=context).data
+            data['rank'] = rank
+            data['snippet'] = snippet
+            results.append(data)
+        return Response({'query': query, 'count': len(results), 'results': results})
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def curriculum(self, request, slug=None):
+        course = self.get_object()
+        serializer = CurriculumSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        modules, counts = import_curriculum(course, serializer.validated_data['modules'])
+        return Response({
+            'course': course.slug,
+            'modules': [{'id': module.id, 'title': module.title, 'order': module.order} for module in modules],
+            'created': counts,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def rating(self, request, slug=None):
+        serializer = CourseRatingSerializer(self.get_object())
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def enrolled(self, request):
-        enrollments = Enrollment.objects.filter(user=request.user)
-        serializer = EnrollmentSerializer(enrollments, many=True)
-        return Response(serializer.data)
+        enrollments = CourseSerializer.setup_eager_loading(
+            Enrollment.objects.filter(user=request.user).select_related('user', 'course', 'last_accessed_module'),
+            self.get_fieldset(),
+            prefix='course__',
+        )
+        paginator = EnrollmentCursorPagination()
+        page = paginator.paginate_queryset(enrollments, request, view=self)
+        serializer = EnrollmentSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def my_progress(self, request, slug=None):
         course = self.get_object()
-        enrollment = Enrollment.objects.filter(course=course, user=request.user).first()
+        enrollment = None
+        # Without a shared cache, loading the entitlements costs more than
+        # the lookup they would save.
+        if not entitlements.cache_is_shared() or entitlements.for_request(request).has_course(course.pk):
+            enrollment = Enrollment.objects.filter(course=course, user=request.user).first()
         if not enrollment:
             return Response({'detail': 'Not enrolled'}, status=status.HTTP_404_NOT_FOUND)
         serializer = EnrollmentSerializer(enrollment)
@@ -128,44 +251,28 @@ class CourseViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def user_progress(self, request):
-        user = request.user
-        enrollments = Enrollment.objects.filter(user=user).select_related('course').prefetch_related(
-            Prefetch('course__modules', queryset=Module.objects.all())
-        )
-        enrolled_courses = []
-        completed_courses = []
-        for enrollment in enrollments:
-            course_data = CourseSerializer(enrollment.course).data
-            course_data['enrollment'] = EnrollmentSerializer(enrollment).data
-            enrolled_courses.append(course_data)
-            if enrollment.is_completed:
-                completed_courses.append(course_data)
-
-        documents_read = DocumentProgress.objects.filter(user=user, read=True).select_related('document')
-        documents_read_data = [
-            {'id': dp.document.id, 'title': dp.document.title, 'read_at': dp.read_at}
-            for dp in documents_read
-        ]
-
-        quizzes_done = QuizAttempt.objects.filter(user=user).select_related('quiz')
-        quizzes_done_data = QuizAttemptSerializer(quizzes_done, many=True).data
-
-        response_data = {
+        dashboard = learner_dashboard(request.user)
+        context = {**self.get_serializer_context(), 'progress': dashboard['progress']}
+        enrolled_courses = LearnerEnrollmentSerializer(dashboard['enrollments'], many=True, context=context).data
+        return Response({
             'enrolled_courses': enrolled_courses,
-            'completed_courses': completed_courses,
-            'documents_read': documents_read_data,
-            'quizzes_done': quizzes_done_data,
-        }
-        return Response(response_data)
+            'completed_courses': [entry for entry in enrolled_courses if entry['is_completed']],
+            'documents_read': dashboard['documents_read'],
+            'quizzes_done': dashboard['quizzes_done'],
+        })
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def drafts(self, request):
-        drafts = Course.objects.filter(instructor=request.user, ispublished=False)
-        serializer = CourseSerializer(drafts, many=True)
-        return Response(serializer.data)
+        drafts = CourseSerializer.setup_eager_loading(
+            Course.objects.filter(instructor=request.user, ispublished=False),
+            self.get_fieldset(),
+        )
+        page = self.paginate_queryset(drafts)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'curriculum']:
             permission_classes = [permissions.IsAdminUser]
         elif self.action in ['enroll', 'enrolled', 'my_progress', 'user_progress', 'drafts']:
             permission_classes = [permissions.IsAuthenticated]
@@ -201,20 +308,18 @@ class ModuleViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='bulk_create')
     def bulk_create(self, request):
-        course_id = request.data.get('course')
-        modules_data = request.data.get('modules', [])
-        created_modules = []
-
-        for module_data in modules_data:
-            if module_data.get('id'):
-                continue
-
-            serializer = self.get_serializer(data=module_data, context={'course_id': course_id})
-            serializer.is_valid(raise_exception=True)
-            module = serializer.save()
-            created_modules.append(serializer.data)
+        payload = ModuleBulkCreateSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        course = payload.validated_data['course']
+        modules_data = [module for module in payload.validated_data['modules'] if not module.get('id')]
+        serializer = self.get_serializer(data=modules_data, many=True, context={'course_id': course.pk})
+        serializer.is_valid(raise_exception=True)
 
-        return Response(created_modules, status=status.HTTP_201_CREATED)
+        modules, _ = import_curriculum(course, serializer.validated_data)
+        modules = Module.objects.filter(pk__in=[module.pk for module in modules]).prefetch_related(
+            'videos', 'documents', 'quizzes__questions__answers',
+        )
+        return Response(self.get_serializer(modules, many=True).data, status=status.HTTP_201_CREATED)
 
 class VideoViewSet(viewsets.ModelViewSet):
     queryset = Video.objects.all()
@@ -227,14 +332,21 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             module = Module.objects.get(id=module_id)
             serializer.save(module=module)
-            module.total_videos = module.videos.count()
-            module.save()
         except Module.DoesNotExist:
             raise ValidationError("Module does not exist")
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def update_progress(self, request, pk=None):
         video = self.get_object()
+        if progress_buffer.enabled():
+            serializer = VideoHeartbeatSerializer(data={
+                'video': video.pk,
+                'watched_duration': request.data.get('watched_duration', 0),
+                'is_completed': request.data.get('is_completed', False),
+            })
+            serializer.is_valid(raise_exception=True)
+            pending = progress_buffer.append(request.user.id, progress_buffer.VIDEO, [serializer.validated_data])
+            return Response({'video': video.pk, **pending[video.pk]}, status=status.HTTP_202_ACCEPTED)
         progress, created = VideoProgress.objects.get_or_create(user=request.user, video=video)
         serializer = VideoProgressSerializer(progress, data=request.data, partial=True)
         if serializer.is_valid():
@@ -242,10 +354,40 @@ class VideoViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=201 if created else 200)
         return Response(serializer.errors, status=400)
 
+    @action(detail=False, methods=['get', 'post'], url_path='progress', permission_classes=[permissions.IsAuthenticated])
+    def batch_progress(self, request):
+        if request.method == 'GET':
+            video_ids = progress_scope(request, Video, 'video', 'module__course')
+            stored = {
+                video_id: {'watched_duration': duration, 'is_completed': completed}
+                for video_id, duration, completed in VideoProgress.objects.filter(
+                    user=request.user, video__in=video_ids,
+                ).values_list('video_id', 'watched_duration', 'is_completed')
+            }
+            progress = progress_buffer.read_back(request.user.id, progress_buffer.VIDEO, set(video_ids), stored)
+            return Response([{'video': video_id, **values} for video_id, values in sorted(progress.items())])
+
+        serializer = VideoHeartbeatBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if progress_buffer.enabled():
+            events = serializer.validated_data['events']
+            pending = progress_buffer.append(request.user.id, progress_buffer.VIDEO, events)
+            return Response({
+                'progress': [{'video': video_id, **pending[video_id]} for video_id in dict.fromkeys(e['video'] for e in events)],
+            }, status=status.HTTP_202_ACCEPTED)
+        rows, unknown = record_video_heartbeats(request.user.id, serializer.validated_data['events'])
+        return Response({
+            'progress': [
+                {'video': row.video_id, 'watched_duration': row.watched_duration, 'is_completed': row.is_completed}
+                for row in rows
+            ],
+            'unknown_videos': unknown,
+        })
+
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [permissions.IsAdminUser]
-        elif self.action == 'update_progress':
+        elif self.action in ['update_progress', 'batch_progress']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -262,14 +404,17 @@ class DocumentViewSet(viewsets.ModelViewSet):
         try:
             module = Module.objects.get(id=module_id)
             serializer.save(module=module)
-            module.total_documents = module.documents.count()
-            module.save()
         except Module.DoesNotExist:
             raise ValidationError("Module does not exist")
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def update_progress(self, request, pk=None):
         document = self.get_object()
+        if progress_buffer.enabled():
+            serializer = DocumentReadSerializer(data={'document': document.pk, 'read': request.data.get('read', True)})
+            serializer.is_valid(raise_exception=True)
+            pending = progress_buffer.append(request.user.id, progress_buffer.DOCUMENT, [serializer.validated_data])
+            return Response({'document': document.pk, **pending[document.pk]}, status=status.HTTP_202_ACCEPTED)
         progress, created = DocumentProgress.objects.get_or_create(user=request.user, document=document)
         serializer = DocumentProgressSerializer(progress, data=request.data, partial=True)
         if serializer.is_valid():
@@ -277,10 +422,22 @@ class DocumentViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=201 if created else 200)
         return Response(serializer.errors, status=400)
 
+    @action(detail=False, methods=['get'], url_path='progress', permission_classes=[permissions.IsAuthenticated])
+    def my_progress(self, request):
+        document_ids = progress_scope(request, Document, 'document', 'module__course')
+        stored = {
+            document_id: {'read': read, 'read_at': read_at}
+            for document_id, read, read_at in DocumentProgress.objects.filter(
+                user=request.user, document__in=document_ids,
+            ).values_list('document_id', 'read', 'read_at')
+        }
+        progress = progress_buffer.read_back(request.user.id, progress_buffer.DOCUMENT, set(document_ids), stored)
+        return Response([{'document': document_id, **values} for document_id, values in sorted(progress.items())])
+
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [permissions.IsAdminUser]
-        elif self.action == 'update_progress':
+        elif self.action in ['update_progress', 'my_progress']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -290,6 +447,12 @@ class QuizViewSet(viewsets.ModelViewSet):
     queryset = Quiz.objects.all()
     serializer_class = QuizSerializer
 
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            qs = qs.prefetch_related('questions__answers')
+        return qs
+
     def perform_create(self, serializer):
         module_id = self.request.data.get('module')
         if not module_id:
@@ -297,31 +460,62 @@ class QuizViewSet(viewsets.ModelViewSet):
         try:
             module = Module.objects.get(id=module_id)
             serializer.save(module=module)
-            module.total_quizzes = module.quizzes.count()
-            module.save()
         except Module.DoesNotExist:
             raise ValidationError("Module does not exist")
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def attempt(self, request, pk=None):
         quiz = self.get_object()
-        serializer = QuizAttemptSerializer(data=request.data, context={'request': request})
-        if serializer.is_valid():
-            serializer.save(user=request.user, quiz=quiz)
-            return Response(serializer.data, status=201)
-        return Response(serializer.errors, status=400)
+        serializer = QuizSubmissionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            attempt = grading.record_attempt(request.user, quiz, serializer.validated_data['answers'])
+        except grading.GradingError as exc:
+            raise ValidationError({'answers': [str(exc)]})
+        return Response(QuizAttemptSerializer(attempt).data, status=201)
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def deliver(self, request, pk=None):
+        quiz = get_object_or_404(Quiz.objects.only('id', 'version'), pk=pk)
+        payload = delivery.delivery_payload(quiz)
+        seed = request.query_params.get('seed')
+        if seed:
+            payload = delivery.shuffled(payload, seed)
+        return Response(payload)
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def grade(self, request, pk=None):
+        quiz = self.get_object()
+        serializer = QuizBatchGradeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        submissions = [(item['user'], item['answers']) for item in serializer.validated_data['submissions']]
+        user_ids = {user_id for user_id, _ in submissions}
+        missing = user_ids - set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        if missing:
+            raise ValidationError({'submissions': [f'Unknown users: {sorted(missing)}']})
+        try:
+            attempts = grading.grade_submissions(quiz, submissions)
+        except grading.GradingError as exc:
+            raise ValidationError({'submissions': [str(exc)]})
+        return Response([
+            {
+                'id': attempt.id, 'user': attempt.user_id, 'score': attempt.score,
+                'correct_count': attempt.correct_count, 'question_count': attempt.question_count,
+            }
+            for attempt in attempts
+        ], status=status.HTTP_201_CREATED)
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'grade']:
             permission_classes = [permissions.IsAdminUser]
-        elif self.action == 'attempt':
+        elif self.action in ['attempt', 'deliver']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAuthenticatedOrReadOnly]
         return [perm() for perm in permission_classes]
 
 class QuestionViewSet(viewsets.ModelViewSet):
-    queryset = Question.objects.all()
+    queryset = Question.objects.prefetch_related('answers')
     serializer_class = QuestionSerializer
 
     def perform_create(self, serializer):
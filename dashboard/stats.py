@@ -0,0 +1,95 @@
+"""Admin dashboard statistics as a cached snapshot.
+
+``compute_stats`` reads every figure with one conditional-aggregate query per
+table; revenue comes from the monthly ``RevenueBucket`` rows rather than a
+scan of every payment. ``snapshot`` keeps the result in the cache: it is served as is for
+``DASHBOARD_STATS_TTL`` seconds, then served stale for up to
+``DASHBOARD_STATS_STALE`` more seconds while one background thread (guarded
+by a cache lock, so one per cluster on a shared cache) recomputes it. Only a
+missing or fully expired snapshot is computed inside the request.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from accounts.models import CustomUser, Membership
+from coaching.models import Event, Participant
+from course.models import Course, Enrollment
+from payments.models import RevenueBucket
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'dashboard-stats'
+REFRESH_LOCK_KEY = 'dashboard-stats:refreshing'
+REFRESH_LOCK_TIMEOUT = 60
+
+
+def compute_stats():
+    now = timezone.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    users = CustomUser.objects.aggregate(
+        total=Count('pk'),
+        new_this_month=Count('pk', filter=Q(created_at__gte=month_start)),
+    )
+    courses = Course.objects.aggregate(
+        total=Count('pk'),
+        published=Count('pk', filter=Q(ispublished=True)),
+    )
+    enrollments = Enrollment.objects.aggregate(
+        total=Count('pk'),
+        completed=Count('pk', filter=Q(is_completed=True)),
+        in_progress=Count('pk', filter=Q(is_completed=False, started_at__isnull=False)),
+    )
+    events = Event.objects.aggregate(
+        total=Count('pk'),
+        upcoming=Count('pk', filter=Q(start_time__gte=now)),
+    )
+    total_revenue = RevenueBucket.objects.filter(period=RevenueBucket.MONTH).aggregate(total=Sum('amount'))['total'] or 0
+    return {
+        'total_users': users['total'],
+        'active_users': Membership.objects.filter(expiration_date__gte=now.date()).count(),
+        'new_users_this_month': users['new_this_month'],
+        'total_courses': courses['total'],
+        'published_courses': courses['published'],
+        'total_enrollments': enrollments['total'],
+        'completed_courses': enrollments['completed'],
+        'courses_in_progress': enrollments['in_progress'],
+        'total_events': events['total'],
+        'upcoming_events': events['upcoming'],
+        'total_participants': Participant.objects.count(),
+        'total_revenue': float(total_revenue),
+    }
+
+
+def _store(stats):
+    entry = {'stats': stats, 'generated_at': time.time()}
+    cache.set(SNAPSHOT_KEY, entry, settings.DASHBOARD_STATS_TTL + settings.DASHBOARD_STATS_STALE)
+    return entry
+
+
+def _refresh():
+    try:
+        _store(compute_stats())
+    except Exception:
+        logger.exception("Dashboard stats refresh failed")
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+        connection.close()
+
+
+def snapshot():
+    """``{'stats': {...}, 'generated_at': epoch seconds}``, refreshed in the background once stale."""
+    entry = cache.get(SNAPSHOT_KEY)
+    if entry is None:
+        return _store(compute_stats())
+    if time.time() - entry['generated_at'] >= settings.DASHBOARD_STATS_TTL and cache.add(
+        REFRESH_LOCK_KEY, 1, REFRESH_LOCK_TIMEOUT,
+    ):
+        threading.Thread(target=_refresh, daemon=True).start()
+    return entry
@@ -1,3 +1,58 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from course.models import Course
+from payments import services
+
+from . import stats
+
+
+@override_settings(DASHBOARD_STATS_TTL=60, DASHBOARD_STATS_STALE=600)
+class StatsSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.learner = User.objects.create_user(email='learner@example.com', password='testpass123')
+        instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.course = Course.objects.create(title='Course', instructor=instructor, final_price=100)
+
+    def pay(self, amount, status='succeeded'):
+        payment = services.create_payment(self.learner, self.course, amount)
+        payment.status = status
+        payment.save(update_fields=['status'])
+        return payment
+
+    def test_revenue_from_buckets(self):
+        self.pay(100)
+        self.pay(50)
+        self.pay(70, status='failed')
+        self.assertEqual(stats.compute_stats()['total_revenue'], 150.0)
+
+        self.pay(30).delete()
+        self.assertEqual(stats.compute_stats()['total_revenue'], 150.0)
+
+    def test_snapshot_is_cached(self):
+        entry = stats.snapshot()
+        self.assertEqual(entry['stats']['total_users'], 2)
+        get_user_model().objects.create_user(email='new@example.com', password='testpass123')
+        with self.assertNumQueries(0):
+            self.assertEqual(stats.snapshot(), entry)
+
+    def test_stale_snapshot_refreshed_once_in_background(self):
+        entry = stats.snapshot()
+        cache.set(stats.SNAPSHOT_KEY, {**entry, 'generated_at': entry['generated_at'] - 61})
+        self.pay(100)
+        with mock.patch.object(stats.threading, 'Thread') as thread:
+            stale = stats.snapshot()
+            stats.snapshot()
+        # Served stale, with one refresh started while the lock is held.
+        self.assertEqual(stale['stats']['total_revenue'], 0.0)
+        thread.assert_called_once_with(target=stats._refresh, daemon=True)
+
+        with mock.patch.object(stats, 'connection'):
+            stats._refresh()
+        self.assertEqual(stats.snapshot()['stats']['total_revenue'], 100.0)
+        self.assertIsNone(cache.get(stats.REFRESH_LOCK_KEY))
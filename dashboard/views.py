@@ -1,50 +1,24 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
-from django.db.models import Count, Sum
+from rest_framework import status
+from django.db.models import Count
 from django.utils import timezone
-from django.db.models.functions import TruncMonth
-from datetime import datetime
-from accounts.models import CustomUser, Membership
-from course.models import Course, Enrollment
-from coaching.models import Event, Participant
-from payments.models import Payment
+from datetime import datetime, timezone as dt_timezone
+import time
+from accounts.models import CustomUser
+from coaching.models import Event
+from payments import revenue
 from community.models import Category, Thread, ThreadReply
 
+from . import stats
+
 class DashboardStatsView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
         try:
-            # User stats
-            total_users = CustomUser.objects.count()
-            active_users = Membership.objects.filter(
-                expiration_date__gte=timezone.now().date()
-            ).count()  # Removed is_active since it may not exist
-            new_users_this_month = CustomUser.objects.filter(
-                created_at__year=timezone.now().year,
-                created_at__month=timezone.now().month
-            ).count()
-
-            # Course stats
-            total_courses = Course.objects.count()
-            published_courses = Course.objects.filter(ispublished=True).count()
-            total_enrollments = Enrollment.objects.count()
-            completed_courses = Enrollment.objects.filter(is_completed=True).count()
-            courses_in_progress = Enrollment.objects.filter(
-                is_completed=False,
-                started_at__isnull=False
-            ).count()
-
-            # Event stats
-            total_events = Event.objects.count()
-            upcoming_events = Event.objects.filter(start_time__gte=timezone.now()).count()
-            total_participants = Participant.objects.count()
-
-            # Payment stats
-            total_revenue = Payment.objects.filter(status='succeeded').aggregate(
-                total_revenue=Sum('amount')
-            )['total_revenue'] or 0
+            entry = stats.snapshot()
 
             # Support requests (mock data; replace with actual model if exists)
             support_requests = [
@@ -58,19 +32,10 @@ class DashboardStatsView(APIView):
             ]
 
             data = {
-                'total_users': total_users,
-                'active_users': active_users,
-                'new_users_this_month': new_users_this_month,
-                'total_courses': total_courses,
-                'published_courses': published_courses,
-                'total_enrollments': total_enrollments,
-                'completed_courses': completed_courses,
-                'courses_in_progress': courses_in_progress,
-                'total_events': total_events,
-                'upcoming_events': upcoming_events,
-                'total_participants': total_participants,
-                'total_revenue': float(total_revenue),
-                'support_requests': support_requests
+                **entry['stats'],
+                'support_requests': support_requests,
+                'generated_at': datetime.fromtimestamp(entry['generated_at'], tz=dt_timezone.utc).isoformat(),
+                'snapshot_age': round(time.time() - entry['generated_at'], 1),
             }
             return Response(data)
         except Exception as e:
@@ -80,28 +45,17 @@ class EarningsChartView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
+        breakdown = request.query_params.get('breakdown')
+        if breakdown and breakdown not in revenue.BREAKDOWNS:
+            return Response(
+                {'error': f"breakdown must be one of: {', '.join(revenue.BREAKDOWNS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         try:
-            end_date = timezone.now().date()
-            # Calculate start date as 11 months ago
-            start_year = end_date.year - 1 if end_date.month < 12 else end_date.year
-            start_month = end_date.month + 1 if end_date.month < 12 else 1
-            start_date = datetime(start_year, start_month, 1).date()
-            earnings = Payment.objects.filter(
-                status='succeeded',
-                created_at__date__gte=start_date,
-                created_at__date__lte=end_date
-            ).annotate(
-                month=TruncMonth('created_at')
-            ).values('month').annotate(
-                total=Sum('amount')
-            ).order_by('month')
-
-            series = [float(e['total']) for e in earnings]
-            categories = [e['month'].strftime('%b %Y') for e in earnings]
-
+            starts, totals = revenue.series(breakdown=breakdown, currency=request.query_params.get('currency'))
             data = {
-                'series': [{'name': 'Earnings', 'data': series}],
-                'categories': categories
+                'series': [{'name': name or 'Earnings', 'data': amounts} for name, amounts in totals.items()],
+                'categories': [start.strftime('%b %Y') for start in starts]
             }
             return Response(data)
         except Exception as e:
@@ -7,3 +7,9 @@ def get_bearer_token(request):
     if auth_header.startswith('Bearer '):
         return auth_header.split(' ', 1)[1]
     return None
+
+
+def get_query_list(request, name):
+    """Split a comma-separated query parameter into a list of values."""
+    raw = request.query_params.get(name, '')
+    return [value.strip() for value in raw.split(',') if value.strip()]
@@ -65,6 +65,7 @@ INSTALLED_APPS = [
     'community',
     'payments',
     'dashboard',
+    'notifications',
 ]
 
 MIDDLEWARE = [
@@ -229,10 +230,43 @@ else:
         'http://devangwacoaching.com',
     ]
 
+# Paid enrollment and event registration charge through payments.services in
+# the same process. Set PAYMENTS_MODE=remote to POST to PAYMENTS_API_BASE_URL
+# instead, for a payments service deployed separately.
+PAYMENTS_MODE = os.getenv('PAYMENTS_MODE', 'local')
 PAYMENTS_API_BASE_URL = os.getenv(
     'PAYMENTS_API_BASE_URL',
     'http://127.0.0.1:8000/api/v1/payments',
 )
+# Remote mode client (payments/client.py): the whole call, retries included,
+# must finish within PAYMENTS_REQUEST_DEADLINE seconds, well under gunicorn's
+# worker timeout. The circuit breaker state lives in the cache, so use a
+# shared backend to have it span workers.
+PAYMENTS_REQUEST_DEADLINE = float(os.getenv('PAYMENTS_REQUEST_DEADLINE', 15))
+PAYMENTS_CONNECT_TIMEOUT = float(os.getenv('PAYMENTS_CONNECT_TIMEOUT', 3))
+PAYMENTS_MAX_ATTEMPTS = int(os.getenv('PAYMENTS_MAX_ATTEMPTS', 3))
+PAYMENTS_BACKOFF_BASE = float(os.getenv('PAYMENTS_BACKOFF_BASE', 0.25))
+PAYMENTS_BACKOFF_MAX = float(os.getenv('PAYMENTS_BACKOFF_MAX', 2))
+PAYMENTS_POOL_SIZE = int(os.getenv('PAYMENTS_POOL_SIZE', 10))
+PAYMENTS_BREAKER_THRESHOLD = int(os.getenv('PAYMENTS_BREAKER_THRESHOLD', 5))
+PAYMENTS_BREAKER_RESET = int(os.getenv('PAYMENTS_BREAKER_RESET', 30))
+# POST /payments/checkout/ only queues the charge and answers 202 `pending`;
+# `manage.py run_payment_worker` processes the queue and clients poll
+# /payments/status/<order_tracking_id>/?wait=<s> (capped at
+# PAYMENTS_STATUS_MAX_WAIT; a waiting client holds a web worker, keep it
+# short). Failed jobs are retried PAYMENTS_JOB_MAX_ATTEMPTS times; running jobs
+# older than PAYMENTS_JOB_LEASE seconds are requeued. The Docker image runs the
+# worker next to gunicorn (RUN_PAYMENT_WORKER=false to run it elsewhere).
+PAYMENTS_ASYNC_CHECKOUT = os.getenv('PAYMENTS_ASYNC_CHECKOUT', 'True').lower() == 'true'
+PAYMENTS_JOB_MAX_ATTEMPTS = int(os.getenv('PAYMENTS_JOB_MAX_ATTEMPTS', 5))
+PAYMENTS_JOB_LEASE = int(os.getenv('PAYMENTS_JOB_LEASE', 300))
+PAYMENTS_STATUS_MAX_WAIT = int(os.getenv('PAYMENTS_STATUS_MAX_WAIT', 3))
+# Seconds a checkout idempotency key stays reserved for a request that has not
+# finished; a retry may take it over afterwards. Keep it above GUNICORN_TIMEOUT.
+PAYMENTS_IDEMPOTENCY_LEASE = int(os.getenv('PAYMENTS_IDEMPOTENCY_LEASE', 180))
+# `manage.py archive_payment_logs` moves PaymentLog rows older than this many
+# days to gzipped JSONL files under var/archive/.
+PAYMENT_LOG_RETENTION_DAYS = int(os.getenv('PAYMENT_LOG_RETENTION_DAYS', 90))
 DEFAULT_CURRENCY = os.getenv('DEFAULT_CURRENCY', 'TZS')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@devangwacoaching.com')
 
@@ -247,6 +281,32 @@ CACHES = {
     }
 }
 
+# Seconds a pre-rendered course detail payload stays cached. Entries are keyed
+# by the course content version, which edits and enrollments move, so the
+# payload is never stale; the timeout only bounds the cache's footprint.
+COURSE_DETAIL_CACHE_TIMEOUT = int(os.getenv('COURSE_DETAIL_CACHE_TIMEOUT', 300))
+
+# Write-behind mode for video/document progress: requests append to spool
+# files under PROGRESS_SPOOL_DIR (shared by all workers on the host) and
+# `manage.py flush_progress` upserts them in batches. Learners see their own
+# unflushed values through a cache overlay kept for PROGRESS_OVERLAY_TIMEOUT
+# seconds; use a shared cache backend so every worker sees it.
+PROGRESS_WRITE_BEHIND = os.getenv('PROGRESS_WRITE_BEHIND', 'False').lower() == 'true'
+PROGRESS_SPOOL_DIR = os.getenv('PROGRESS_SPOOL_DIR', os.path.join(BASE_DIR, 'var', 'progress'))
+PROGRESS_OVERLAY_TIMEOUT = int(os.getenv('PROGRESS_OVERLAY_TIMEOUT', 600))
+
+# Seconds a user's cached entitlements (enrolled courses, registered and paid
+# events) live. Writes to those rows invalidate the entry immediately; the
+# timeout only bounds memory. Entitlements are only cached on a shared cache
+# backend (not LocMemCache), since invalidation must reach every worker.
+ENTITLEMENTS_CACHE_TIMEOUT = int(os.getenv('ENTITLEMENTS_CACHE_TIMEOUT', 3600))
+
+# Admin dashboard stats snapshot: fresh for DASHBOARD_STATS_TTL seconds, then
+# served stale for up to DASHBOARD_STATS_STALE more while it is recomputed in
+# the background. Responses carry the snapshot age.
+DASHBOARD_STATS_TTL = int(os.getenv('DASHBOARD_STATS_TTL', 60))
+DASHBOARD_STATS_STALE = int(os.getenv('DASHBOARD_STATS_STALE', 600))
+
 # Email settings
 EMAIL_BACKEND = os.getenv(
     'EMAIL_BACKEND',
@@ -259,6 +319,16 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'False').lower() == 'true'
 
+# Email outbox (notifications app): payment confirmations are queued in the
+# database and `manage.py send_outbox_emails` delivers them through
+# OUTBOX_EMAIL_BACKEND, one connection per batch. Set
+# EMAIL_BACKEND=notifications.backends.OutboxEmailBackend to queue djoser and
+# all other Django emails the same way.
+OUTBOX_EMAIL_BACKEND = os.getenv('OUTBOX_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 6))
+OUTBOX_RETRY_DELAY = int(os.getenv('OUTBOX_RETRY_DELAY', 30))
+OUTBOX_LEASE = int(os.getenv('OUTBOX_LEASE', 300))
+
 # Production security settings
 if not DEBUG:
     SECURE_SSL_REDIRECT = os.getenv('SECURE_SSL_REDIRECT', 'True').lower() == 'true'
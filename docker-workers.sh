@@ -0,0 +1,23 @@
+#!/bin/sh
+# Background processes that run next to gunicorn in the container. Each one
+# is restarted if it exits. Disable one with its RUN_* variable when it runs
+# in a separate container instead.
+
+cd /app/devangwabackend
+
+keep_running() {
+    while true; do
+        "$@" || echo "$* exited with status $?; restarting" >&2
+        sleep 5
+    done
+}
+
+if [ "${RUN_PAYMENT_WORKER:-true}" = "true" ]; then
+    keep_running python manage.py run_payment_worker &
+fi
+
+if [ "${RUN_OUTBOX_SENDER:-true}" = "true" ]; then
+    keep_running python manage.py send_outbox_emails --loop &
+fi
+
+wait
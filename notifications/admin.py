@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import OutboxEmail
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to')
+    ordering = ('-created_at',)
+    readonly_fields = ('attempts', 'locked_at', 'last_error', 'created_at', 'sent_at')
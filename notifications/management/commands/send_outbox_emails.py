@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails in batches over one mail connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sending every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=5.0)
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = outbox.send_pending(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f'Sent {sent} email(s), {failed} failed.')
+            if not options['loop']:
+                return
+            if not (sent or failed):
+                time.sleep(options['interval'])
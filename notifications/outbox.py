@@ -0,0 +1,137 @@
+"""Transactional email outbox.
+
+``enqueue`` stores messages as ``OutboxEmail`` rows on the caller's database
+connection, so inside ``transaction.atomic()`` an email is only kept if the
+business change that caused it commits. ``OutboxEmailBackend`` does the same
+for anything sent through Django's mail API (djoser's password reset and
+activation emails, ``send_mail``) when it is the ``EMAIL_BACKEND``.
+
+``send_pending`` (``manage.py send_outbox_emails``) claims a batch, delivers
+it over one connection of ``OUTBOX_EMAIL_BACKEND`` (SMTP by default) and
+retries failures with exponential backoff up to ``OUTBOX_MAX_ATTEMPTS``.
+Claiming works like ``payments.jobs``: ``SKIP LOCKED`` where supported,
+conditional updates elsewhere, and rows stuck in ``sending`` past
+``OUTBOX_LEASE`` seconds are picked up again.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def _row(message):
+    return OutboxEmail(
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(message.to),
+        cc=list(message.cc),
+        bcc=list(message.bcc),
+        reply_to=list(message.reply_to),
+        headers=dict(message.extra_headers),
+        alternatives=[list(alternative) for alternative in getattr(message, 'alternatives', ())],
+    )
+
+
+def enqueue(messages):
+    """Store ``EmailMessage`` objects for delivery; returns the rows.
+
+    Attachments are not supported and are dropped with a warning.
+    """
+    rows = []
+    for message in messages:
+        if message.attachments:
+            logger.warning("Outbox drops %d attachment(s) of %r", len(message.attachments), message.subject)
+        rows.append(_row(message))
+    return OutboxEmail.objects.bulk_create(rows)
+
+
+def enqueue_mail(subject, message, recipient_list, from_email=None, html_message=None):
+    """``send_mail`` counterpart that writes to the outbox."""
+    email = EmailMultiAlternatives(subject, message, from_email, recipient_list)
+    if html_message:
+        email.attach_alternative(html_message, 'text/html')
+    return enqueue([email])[0]
+
+
+def _message(row):
+    message = EmailMultiAlternatives(
+        subject=row.subject, body=row.body, from_email=row.from_email,
+        to=row.to, cc=row.cc, bcc=row.bcc, reply_to=row.reply_to, headers=row.headers,
+    )
+    for content, mimetype in row.alternatives:
+        message.attach_alternative(content, mimetype)
+    return message
+
+
+def requeue_stale():
+    cutoff = timezone.now() - timedelta(seconds=settings.OUTBOX_LEASE)
+    return OutboxEmail.objects.filter(status=OutboxEmail.SENDING, locked_at__lt=cutoff).update(
+        status=OutboxEmail.PENDING, locked_at=None,
+    )
+
+
+def claim(limit):
+    """Mark up to ``limit`` due emails as sending for this process; returns their ids."""
+    now = timezone.now()
+    due = OutboxEmail.objects.filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now).order_by('next_attempt_at', 'pk')
+    claim_fields = {'status': OutboxEmail.SENDING, 'locked_at': now, 'attempts': F('attempts') + 1}
+    if db_connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            OutboxEmail.objects.filter(pk__in=ids).update(**claim_fields)
+        return ids
+    return [
+        email_id for email_id in due.values_list('pk', flat=True)[:limit]
+        if OutboxEmail.objects.filter(pk=email_id, status=OutboxEmail.PENDING).update(**claim_fields)
+    ]
+
+
+def _failed(row, error, now):
+    row.last_error = error
+    if row.attempts < settings.OUTBOX_MAX_ATTEMPTS:
+        row.status = OutboxEmail.PENDING
+        row.next_attempt_at = now + timedelta(seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (row.attempts - 1))
+    else:
+        row.status = OutboxEmail.FAILED
+    return row
+
+
+def send_pending(batch_size=100):
+    """Deliver one batch over a single mail connection; returns ``(sent, failed)``."""
+    requeue_stale()
+    rows = list(OutboxEmail.objects.filter(pk__in=claim(batch_size)).order_by('pk'))
+    if not rows:
+        return 0, 0
+    now = timezone.now()
+    sent, failed = [], []
+    mail = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+    try:
+        mail.open()
+    except Exception as e:
+        logger.exception("Outbox could not open a mail connection")
+        failed = [_failed(row, str(e), now) for row in rows]
+    else:
+        try:
+            for row in rows:
+                try:
+                    mail.send_messages([_message(row)])
+                except Exception as e:
+                    logger.warning("Outbox email %s failed: %s", row.pk, e)
+                    failed.append(_failed(row, str(e), now))
+                else:
+                    row.status, row.sent_at = OutboxEmail.SENT, now
+                    sent.append(row)
+        finally:
+            mail.close()
+    OutboxEmail.objects.bulk_update(sent, ['status', 'sent_at'])
+    OutboxEmail.objects.bulk_update(failed, ['status', 'next_attempt_at', 'last_error'])
+    return len(sent), len(failed)
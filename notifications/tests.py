@@ -0,0 +1,65 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import outbox
+from .models import OutboxEmail
+
+
+@override_settings(
+    OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_DELAY=30,
+)
+class OutboxTests(TestCase):
+    def enqueue(self, count):
+        return [
+            outbox.enqueue_mail(f'Subject {n}', 'Body', [f'user{n}@example.com'], html_message='<p>Body</p>')
+            for n in range(count)
+        ]
+
+    def test_sends_in_batches_and_marks_sent(self):
+        self.enqueue(3)
+        self.assertEqual(outbox.send_pending(batch_size=2), (2, 0))
+        self.assertEqual(outbox.send_pending(batch_size=2), (1, 0))
+        self.assertEqual(outbox.send_pending(batch_size=2), (0, 0))
+        self.assertEqual([message.subject for message in mail.outbox], ['Subject 0', 'Subject 1', 'Subject 2'])
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>Body</p>', 'text/html')])
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+        self.assertFalse(OutboxEmail.objects.filter(sent_at__isnull=True).exists())
+
+    def test_failure_backs_off_then_gives_up(self):
+        row, = self.enqueue(1)
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=OSError('connection reset')):
+            for attempt in range(1, 4):
+                before = timezone.now()
+                self.assertEqual(outbox.send_pending(), (0, 1))
+                row.refresh_from_db()
+                self.assertEqual((row.attempts, row.last_error), (attempt, 'connection reset'))
+                if attempt < 3:
+                    self.assertEqual(row.status, OutboxEmail.PENDING)
+                    self.assertGreaterEqual(row.next_attempt_at, before + timedelta(seconds=30 * 2 ** (attempt - 1)))
+                    # Not due yet.
+                    self.assertEqual(outbox.send_pending(), (0, 0))
+                    OutboxEmail.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(row.status, OutboxEmail.FAILED)
+        self.assertEqual(mail.outbox, [])
+
+    def test_stale_sending_row_is_picked_up_again(self):
+        row, = self.enqueue(1)
+        OutboxEmail.objects.filter(pk=row.pk).update(
+            status=OutboxEmail.SENDING, locked_at=timezone.now() - timedelta(hours=1), attempts=1,
+        )
+        self.assertEqual(outbox.send_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_admin_lists_outbox(self):
+        admin = get_user_model().objects.create_superuser(email='admin@example.com', password='testpass123')
+        self.enqueue(1)
+        self.client.force_login(admin)
+        response = self.client.get('/api/v1/admin/notifications/outboxemail/')
+        self.assertContains(response, 'Subject 0')
@@ -0,0 +1,145 @@
+"""Outbound HTTP client for a remote payments service.
+
+Used by ``payments.services`` when ``PAYMENTS_MODE=remote``. Every call gets
+an overall deadline (``PAYMENTS_REQUEST_DEADLINE`` seconds): each attempt's
+connect/read timeouts are cut to what is left of it, and a retry only
+happens if its backoff still fits. Connection errors, timeouts and 429/5xx
+answers are retried with jittered exponential backoff on one pooled
+``requests.Session`` per process. Other 4xx answers are the provider
+rejecting the request and are raised as ``PaymentRejected`` without retrying.
+
+A circuit breaker kept in the Django cache (shared by every worker when the
+cache backend is) opens after ``PAYMENTS_BREAKER_THRESHOLD`` consecutive
+failed calls. While open, calls fail fast with ``CircuitOpen``. After
+``PAYMENTS_BREAKER_RESET`` seconds a single probe call is let through; its
+outcome closes the breaker or re-opens it.
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PaymentClientError(requests.RequestException):
+    pass
+
+
+class CircuitOpen(PaymentClientError):
+    pass
+
+
+class DeadlineExceeded(PaymentClientError):
+    pass
+
+
+class PaymentRejected(PaymentClientError):
+    """The service answered with a non-retryable 4xx; ``response`` holds it."""
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session():
+    """The process-wide pooled session."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pooled = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=settings.PAYMENTS_POOL_SIZE, max_retries=0)
+                pooled.mount('http://', adapter)
+                pooled.mount('https://', adapter)
+                _session = pooled
+    return _session
+
+
+class CircuitBreaker:
+    def __init__(self, name):
+        self.failures_key = f'circuit:{name}:failures'
+        self.opened_key = f'circuit:{name}:opened'
+        self.probe_key = f'circuit:{name}:probe'
+
+    def allow(self):
+        opened_at = cache.get(self.opened_key)
+        if opened_at is None:
+            return True
+        if time.time() - opened_at < settings.PAYMENTS_BREAKER_RESET:
+            return False
+        # Half-open: one caller across all workers probes the service.
+        return cache.add(self.probe_key, 1, settings.PAYMENTS_BREAKER_RESET)
+
+    def is_open(self):
+        return cache.get(self.opened_key) is not None
+
+    def record_success(self):
+        cache.delete_many([self.failures_key, self.opened_key, self.probe_key])
+
+    def record_failure(self):
+        cache.add(self.failures_key, 0, settings.PAYMENTS_BREAKER_RESET * 10)
+        failures = cache.incr(self.failures_key)
+        if self.is_open() or failures >= settings.PAYMENTS_BREAKER_THRESHOLD:
+            cache.set(self.opened_key, time.time(), None)
+            cache.delete(self.probe_key)
+
+
+breaker = CircuitBreaker('payments')
+
+
+def backoff(attempt):
+    """Full-jitter exponential delay before retry number ``attempt`` (1-based)."""
+    ceiling = min(settings.PAYMENTS_BACKOFF_MAX, settings.PAYMENTS_BACKOFF_BASE * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def request_json(method, path, payload=None, params=None, headers=None, deadline=None):
+    """Send a request to ``PAYMENTS_API_BASE_URL + path``; returns the decoded JSON.
+
+    ``deadline`` overrides ``PAYMENTS_REQUEST_DEADLINE`` (seconds for the
+    whole call, retries included).
+    """
+    if not breaker.allow():
+        raise CircuitOpen('Payment service unavailable; circuit is open.')
+    url = f"{settings.PAYMENTS_API_BASE_URL}{path}"
+    expires = time.monotonic() + (deadline or settings.PAYMENTS_REQUEST_DEADLINE)
+    error = None
+    for attempt in range(1, settings.PAYMENTS_MAX_ATTEMPTS + 1):
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            response = session().request(
+                method, url, json=payload, params=params, headers=headers,
+                timeout=(min(settings.PAYMENTS_CONNECT_TIMEOUT, remaining), remaining),
+            )
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            error = exc
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                if response.status_code >= 400:
+                    raise PaymentRejected(f'Payment service rejected the request ({response.status_code}).', response=response)
+                return response.json()
+            error = requests.HTTPError(f'Payment service returned {response.status_code}.', response=response)
+        delay = backoff(attempt)
+        if attempt == settings.PAYMENTS_MAX_ATTEMPTS or time.monotonic() + delay >= expires:
+            break
+        time.sleep(delay)
+    breaker.record_failure()
+    if error is None:
+        raise DeadlineExceeded('Payment service deadline exceeded.')
+    raise error
+
+
+def post_json(path, payload, headers=None, deadline=None):
+    return request_json('POST', path, payload=payload, headers=headers, deadline=deadline)
+
+
+def get_json(path, params=None, headers=None, deadline=None):
+    return request_json('GET', path, params=params, headers=headers, deadline=deadline)
@@ -0,0 +1,97 @@
+"""Per-instructor daily earnings rollup.
+
+``InstructorEarningsDaily`` holds the total and count of succeeded payments
+per (instructor, day, currency), where the instructor is the owner of the
+paid course or event and the day is the payment's creation date. Signals in
+``payments.signals`` apply each payment once when its status becomes
+``succeeded`` (and take it back if it leaves that status or is deleted), so
+``totals`` answers with one aggregate over the instructor's rows instead of
+scanning payment history. ``rebuild`` recomputes the table from the payments
+(``backfill_earnings_rollup``).
+"""
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import InstructorEarningsDaily, Payment
+
+# Owner field of each payable model.
+INSTRUCTOR_FIELDS = {
+    'course.Course': 'instructor',
+    'coaching.Event': 'created_by',
+}
+
+
+def _owners():
+    for label, field in INSTRUCTOR_FIELDS.items():
+        model = apps.get_model(label)
+        yield ContentType.objects.get_for_model(model), model, f'{field}_id'
+
+
+def instructor_id(payment):
+    for content_type, model, field in _owners():
+        if payment.content_type_id == content_type.pk:
+            return model.objects.filter(pk=payment.object_id).values_list(field, flat=True).first()
+    return None
+
+
+def apply(payment, sign):
+    """Add (``sign=1``) or remove (``sign=-1``) ``payment`` from its instructor's rollup."""
+    owner_id = instructor_id(payment)
+    if owner_id is None:
+        return
+    key = {'instructor_id': owner_id, 'day': timezone.localdate(payment.created_at), 'currency': payment.currency}
+    amount = payment.amount * sign
+    if InstructorEarningsDaily.objects.filter(**key).update(
+        amount=F('amount') + amount, payments_count=F('payments_count') + sign,
+    ):
+        return
+    try:
+        with transaction.atomic():
+            InstructorEarningsDaily.objects.create(**key, amount=amount, payments_count=sign)
+    except IntegrityError:
+        # Another request created the row first.
+        InstructorEarningsDaily.objects.filter(**key).update(
+            amount=F('amount') + amount, payments_count=F('payments_count') + sign,
+        )
+
+
+def rebuild():
+    """Recompute the whole rollup from succeeded payments; returns the number of rows."""
+    rows = []
+    for content_type, model, field in _owners():
+        owner = model.objects.filter(pk=OuterRef('object_id')).values(field)[:1]
+        rows.extend(
+            Payment.objects.filter(status='succeeded', content_type=content_type)
+            .annotate(owner_id=Subquery(owner), day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+            .filter(owner_id__isnull=False)
+            .order_by()
+            .values('owner_id', 'day', 'currency')
+            .annotate(total=Sum('amount'), count=Count('pk'))
+        )
+    merged = {}
+    for row in rows:
+        key = (row['owner_id'], row['day'], row['currency'])
+        amount, count = merged.get(key, (0, 0))
+        merged[key] = (amount + row['total'], count + row['count'])
+    with transaction.atomic():
+        InstructorEarningsDaily.objects.all().delete()
+        InstructorEarningsDaily.objects.bulk_create([
+            InstructorEarningsDaily(instructor_id=owner_id, day=day, currency=currency, amount=amount, payments_count=count)
+            for (owner_id, day, currency), (amount, count) in merged.items()
+        ], batch_size=1000)
+    return len(merged)
+
+
+def totals(instructor):
+    """``{'month': ..., 'lifetime': ..., 'payments': ...}`` from the rollup, in one query."""
+    month_start = timezone.localdate().replace(day=1)
+    result = InstructorEarningsDaily.objects.filter(instructor=instructor).aggregate(
+        month=Sum('amount', filter=Q(day__gte=month_start)),
+        lifetime=Sum('amount'),
+        payments=Sum('payments_count'),
+    )
+    return {name: value or 0 for name, value in result.items()}
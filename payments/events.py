@@ -0,0 +1,86 @@
+"""Append-only payment event log: batched writes and archiving.
+
+``PaymentEventRecorder`` collects the ``PaymentLog`` entries of one payment
+operation and writes them with a single ``bulk_create``. Used as the outer
+context manager around ``transaction.atomic()``, it flushes when the
+transaction commits. If the block raises, only the provider-side entries
+(``PROVIDER_ACTIONS``) are flushed right after the rollback: what happened at
+the provider stays true even when our own writes are undone, while entries
+such as ``confirmed`` describe changes that were rolled back and are dropped.
+
+``archive_logs`` moves entries older than a cutoff into gzipped JSON-lines
+files and deletes them from the table (``archive_payment_logs``).
+"""
+import gzip
+import json
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PaymentLog
+
+# Actions that record the provider's answer rather than our own writes.
+PROVIDER_ACTIONS = ('processed', 'failed')
+
+
+class PaymentEventRecorder:
+    def __init__(self):
+        self.entries = []
+
+    def record(self, payment, action, details=None):
+        self.entries.append(PaymentLog(payment=payment, action=action, details=details))
+
+    def flush(self):
+        entries, self.entries = self.entries, []
+        if entries:
+            PaymentLog.objects.bulk_create(entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            transaction.on_commit(self.flush)
+        else:
+            self.entries = [entry for entry in self.entries if entry.action in PROVIDER_ACTIONS]
+            self.flush()
+        return False
+
+
+def archive_logs(before, directory, batch_size=5000):
+    """Write ``PaymentLog`` rows created before ``before`` to a gzipped JSONL file and delete them.
+
+    Rows are deleted batch by batch, only after the file has been written and
+    synced. Returns ``(path, count)``; ``path`` is None when nothing was old
+    enough.
+    """
+    old = PaymentLog.objects.filter(created_at__lt=before).order_by('pk')
+    last_pk = old.values_list('pk', flat=True).last()
+    if last_pk is None:
+        return None, 0
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"payment-logs-{timezone.now():%Y%m%d%H%M%S}.jsonl.gz")
+    count, cursor = 0, 0
+    with open(path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+            while True:
+                rows = list(old.filter(pk__gt=cursor, pk__lte=last_pk).values(
+                    'pk', 'payment_id', 'payment__order_tracking_id', 'action', 'details', 'created_at',
+                )[:batch_size])
+                if not rows:
+                    break
+                archive.write(''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows).encode())
+                count += len(rows)
+                cursor = rows[-1]['pk']
+        raw.flush()
+        os.fsync(raw.fileno())
+    deleted_to = 0
+    while deleted_to < last_pk:
+        batch = list(old.filter(pk__gt=deleted_to, pk__lte=last_pk).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        PaymentLog.objects.filter(pk__in=batch).delete()
+        deleted_to = batch[-1]
+    return path, count
@@ -0,0 +1,84 @@
+"""Idempotency keys for checkout, scoped per user.
+
+``reserve`` claims ``(user, key)`` with a single INSERT; the unique constraint
+decides which of several concurrent requests runs. Every other request with
+the same key gets the stored response replayed once the winner has recorded
+it with ``complete``, a ``409`` while it is still running, or a ``422`` if
+the key is reused for a different request body. Responses that should not
+be replayed (server errors) ``release`` the key so the client can retry.
+
+A reservation is a lease of ``PAYMENTS_IDEMPOTENCY_LEASE`` seconds: if its
+request died before completing (worker killed, timeout), a retry of the same
+request takes the key over with a conditional UPDATE once the lease has run
+out. ``complete`` and ``release`` only act on the lease they were given, so
+a request that lost its key cannot overwrite the new holder's response.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+def fingerprint(data):
+    payload = {name: value for name, value in data.items() if name != 'idempotency_key'}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def reserve(user, key, request_fingerprint):
+    """Returns ``(record, reserved)``; ``reserved`` is False when the key is held or was used."""
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, fingerprint=request_fingerprint), True
+        except IntegrityError:
+            pass
+        now = timezone.now()
+        abandoned = IdempotencyKey.objects.filter(
+            user=user, key=key, fingerprint=request_fingerprint, response_status__isnull=True,
+            created_at__lt=now - timedelta(seconds=settings.PAYMENTS_IDEMPOTENCY_LEASE),
+        )
+        taken = abandoned.update(created_at=now)
+        try:
+            return IdempotencyKey.objects.get(user=user, key=key), bool(taken)
+        except IdempotencyKey.DoesNotExist:
+            # The holder released the key after our INSERT failed; try once more.
+            if attempt:
+                raise
+
+
+def _held(record):
+    return IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at)
+
+
+def replay(record, request_fingerprint):
+    """The response for a duplicate request."""
+    if record.fingerprint != request_fingerprint:
+        return Response(
+            {'detail': 'Idempotency key was already used for a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.response_status is None:
+        return Response(
+            {'detail': 'A request with this idempotency key is still being processed.'},
+            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'},
+        )
+    return Response(record.response_body, status=record.response_status)
+
+
+def complete(record, response):
+    """Store ``response`` for replay, or release the key for a server error."""
+    if response.status_code >= 500:
+        release(record)
+        return
+    _held(record).update(response_status=response.status_code, response_body=response.data)
+
+
+def release(record):
+    _held(record).delete()
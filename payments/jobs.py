@@ -0,0 +1,135 @@
+"""Database-backed queue for payment processing.
+
+``services.enqueue_checkout`` stores a ``PaymentJob`` next to each pending
+payment. ``run_payment_worker`` calls ``run_pending``: jobs are claimed with
+``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it
+(PostgreSQL). Elsewhere (SQLite) each candidate is claimed with a conditional
+``UPDATE ... WHERE status = 'queued'``, so two workers never run the same
+job. A failed job is retried with exponential backoff up to
+``PAYMENTS_JOB_MAX_ATTEMPTS`` times before its payment is marked failed, and
+a job left ``running`` past ``PAYMENTS_JOB_LEASE`` seconds (a crashed
+worker) is queued again.
+
+When a payment settles, its status is also written to the cache so
+``payment_status`` long-polls can return without re-reading the table.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import PaymentEventRecorder
+from .models import Payment, PaymentJob
+from .services import process_payment
+
+logger = logging.getLogger(__name__)
+
+STATUS_POLL_INTERVAL = 0.25
+# Long-polls re-read the table every this many polls, in case the cache is not
+# shared with the worker.
+STATUS_DB_POLL_EVERY = 8
+STATUS_CACHE_TIMEOUT = 300
+
+
+def _status_key(order_tracking_id):
+    return f'payment-status:{order_tracking_id}'
+
+
+def _publish(payment):
+    cache.set(_status_key(payment.order_tracking_id), payment.status, STATUS_CACHE_TIMEOUT)
+
+
+def requeue_stale():
+    """Queue again jobs whose worker died mid-run; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=settings.PAYMENTS_JOB_LEASE)
+    return PaymentJob.objects.filter(status=PaymentJob.RUNNING, locked_at__lt=cutoff).update(
+        status=PaymentJob.QUEUED, locked_at=None,
+    )
+
+
+def claim(limit):
+    """Mark up to ``limit`` due jobs as running for this worker; returns their ids."""
+    now = timezone.now()
+    due = PaymentJob.objects.filter(status=PaymentJob.QUEUED, run_after__lte=now).order_by('run_after', 'pk')
+    claim_fields = {'status': PaymentJob.RUNNING, 'locked_at': now, 'attempts': F('attempts') + 1}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            PaymentJob.objects.filter(pk__in=ids).update(**claim_fields)
+        return ids
+    return [
+        job_id for job_id in due.values_list('pk', flat=True)[:limit]
+        if PaymentJob.objects.filter(pk=job_id, status=PaymentJob.QUEUED).update(**claim_fields)
+    ]
+
+
+def _fail(job, error):
+    job.last_error = error
+    if job.attempts < settings.PAYMENTS_JOB_MAX_ATTEMPTS:
+        job.status = PaymentJob.QUEUED
+        job.run_after = timezone.now() + timedelta(seconds=2 ** job.attempts)
+        job.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+        return
+    job.status = PaymentJob.FAILED
+    job.payload = {}
+    job.save(update_fields=['status', 'payload', 'last_error', 'updated_at'])
+    # Re-read: the failed attempt's own status change may have been rolled back.
+    payment = Payment.objects.get(pk=job.payment_id)
+    with PaymentEventRecorder() as events, transaction.atomic():
+        payment.status = 'failed'
+        payment.save(update_fields=['status'])
+        events.record(payment, 'failed', {'error': error})
+    _publish(payment)
+
+
+def run_job(job_id):
+    """Process one claimed job; returns its final status."""
+    job = PaymentJob.objects.select_related('payment__user').get(pk=job_id)
+    payment = job.payment
+    try:
+        if payment.status == 'pending':
+            process_payment(payment, **job.payload)
+    except Exception as e:
+        logger.exception("Payment job %s failed", job.pk)
+        _fail(job, str(e))
+        return job.status
+    job.status = PaymentJob.DONE
+    job.payload = {}
+    job.save(update_fields=['status', 'payload', 'updated_at'])
+    _publish(payment)
+    return job.status
+
+
+def run_pending(batch_size=10):
+    """Claim and run one batch of due jobs; returns how many were run."""
+    requeue_stale()
+    job_ids = claim(batch_size)
+    for job_id in job_ids:
+        run_job(job_id)
+    return len(job_ids)
+
+
+def _stored_status(user, order_tracking_id):
+    return Payment.objects.filter(user=user, order_tracking_id=order_tracking_id).values_list('status', flat=True).first()
+
+
+def payment_status(user, order_tracking_id, wait=0):
+    """Status of ``user``'s payment, waiting up to ``wait`` seconds while it is pending.
+
+    Returns ``None`` when the payment does not exist or is not the user's.
+    """
+    status = _stored_status(user, order_tracking_id)
+    expires = time.monotonic() + min(wait, settings.PAYMENTS_STATUS_MAX_WAIT)
+    polls = 0
+    while status == 'pending' and time.monotonic() < expires:
+        time.sleep(STATUS_POLL_INTERVAL)
+        polls += 1
+        status = cache.get(_status_key(order_tracking_id)) or (
+            _stored_status(user, order_tracking_id) if polls % STATUS_DB_POLL_EVERY == 0 else status
+        )
+    return status
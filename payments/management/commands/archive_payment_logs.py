@@ -0,0 +1,25 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.events import archive_logs
+
+
+class Command(BaseCommand):
+    help = 'Move PaymentLog rows older than --days into a gzipped JSON-lines archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.PAYMENT_LOG_RETENTION_DAYS)
+        parser.add_argument('--output', default=os.path.join(settings.BASE_DIR, 'var', 'archive'))
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        path, count = archive_logs(before, options['output'], options['batch_size'])
+        if path is None:
+            self.stdout.write('No payment logs to archive.')
+        else:
+            self.stdout.write(f'Archived {count} payment log(s) to {path}.')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from payments.earnings import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-instructor daily earnings rollup from succeeded payments.'
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(f'Rebuilt {rows} instructor earnings row(s).')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from payments.revenue import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and monthly revenue buckets from succeeded payments.'
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(f'Rebuilt {rows} revenue bucket row(s).')
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments import jobs
+
+
+class Command(BaseCommand):
+    help = 'Process queued payment jobs (asynchronous checkout).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one batch and exit.')
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = jobs.run_pending(options['batch_size'])
+            if processed or options['once']:
+                self.stdout.write(f'Processed {processed} payment job(s).')
+            if options['once']:
+                return
+            if not processed:
+                time.sleep(options['interval'])
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.15 on 2026-10-18 10:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_earnings(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Payment = apps.get_model('payments', 'Payment')
+    InstructorEarningsDaily = apps.get_model('payments', 'InstructorEarningsDaily')
+    merged = {}
+    for app_label, model_name, field in (('course', 'Course', 'instructor_id'), ('coaching', 'Event', 'created_by_id')):
+        content_type = ContentType.objects.filter(app_label=app_label, model=model_name.lower()).first()
+        if content_type is None:
+            continue
+        owner = apps.get_model(app_label, model_name).objects.filter(pk=OuterRef('object_id')).values(field)[:1]
+        rows = (
+            Payment.objects.filter(status='succeeded', content_type=content_type)
+            .annotate(owner_id=Subquery(owner), day=TruncDate('created_at'))
+            .filter(owner_id__isnull=False)
+            .order_by()
+            .values('owner_id', 'day', 'currency')
+            .annotate(total=Sum('amount'), count=Count('pk'))
+        )
+        for row in rows:
+            key = (row['owner_id'], row['day'], row['currency'])
+            amount, count = merged.get(key, (0, 0))
+            merged[key] = (amount + row['total'], count + row['count'])
+    InstructorEarningsDaily.objects.bulk_create([
+        InstructorEarningsDaily(instructor_id=owner_id, day=day, currency=currency, amount=amount, payments_count=count)
+        for (owner_id, day, currency), (amount, count) in merged.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0003_idempotency_key'),
+        ('course', '0009_quiz_grading'),
+        ('coaching', '0001_initial'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstructorEarningsDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('currency', models.CharField(max_length=3)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments_count', models.PositiveIntegerField(default=0)),
+                ('instructor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='earnings_daily', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('instructor', 'day', 'currency')},
+            },
+        ),
+        migrations.RunPython(backfill_earnings, migrations.RunPython.noop),
+    ]
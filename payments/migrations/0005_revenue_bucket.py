@@ -0,0 +1,53 @@
+# Generated by Django 4.2.15 on 2026-10-18 10:09
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+
+
+def backfill_revenue(apps, schema_editor):
+    Payment = apps.get_model('payments', 'Payment')
+    RevenueBucket = apps.get_model('payments', 'RevenueBucket')
+    buckets = []
+    for period, trunc in (('day', TruncDate('created_at')), ('month', TruncMonth('created_at', output_field=DateField()))):
+        rows = (
+            Payment.objects.filter(status='succeeded')
+            .annotate(start=trunc)
+            .order_by()
+            .values('start', 'currency', 'payment_method')
+            .annotate(total=Sum('amount'), count=Count('pk'))
+        )
+        buckets.extend(
+            RevenueBucket(
+                period=period, start=row['start'], currency=row['currency'], payment_method=row['payment_method'],
+                amount=row['total'], payments_count=row['count'],
+            )
+            for row in rows
+        )
+    RevenueBucket.objects.bulk_create(buckets, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_instructor_earnings_daily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField()),
+                ('currency', models.CharField(max_length=3)),
+                ('payment_method', models.CharField(choices=[('mpesa', 'M-Pesa'), ('vodacom', 'Vodacom'), ('airtel', 'Airtel'), ('mtn', 'MTN'), ('card', 'Card')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('period', 'start', 'currency', 'payment_method')},
+            },
+        ),
+        migrations.RunPython(backfill_revenue, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 import uuid
 import re
 
@@ -33,9 +34,22 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS, default='mpesa')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Succeeded payments added (1) or removed (-1) by the last save or delete,
+    # for the earnings and revenue rollups; None until one ran on this instance.
+    succeeded_delta = None
+
     def __str__(self):
         return f"Payment {self.order_tracking_id} for {self.content_object}"
 
+    def _move_succeeded(self, status):
+        # Writes ``status`` only if it changes whether the stored row counts as
+        # succeeded, so of several concurrent (or stale) writers only one moves
+        # the rollups.
+        rows = Payment._base_manager.filter(pk=self.pk)
+        if status == 'succeeded':
+            return rows.exclude(status='succeeded').update(status=status)
+        return -rows.filter(status='succeeded').update(status=status)
+
     def clean(self):
         if self.amount <= 0:
             raise ValidationError("Amount must be positive.")
@@ -45,8 +59,26 @@ class Payment(models.Model):
             raise ValidationError("Invalid order tracking ID format.")
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.full_clean()
+        else:
+            # Status transitions only validate the fields they write, without
+            # the uniqueness and foreign key queries of full_clean().
+            self.clean_fields(exclude=[field.name for field in self._meta.fields if field.name not in update_fields])
+        with transaction.atomic():
+            if self._state.adding:
+                self.succeeded_delta = int(self.status == 'succeeded')
+            elif update_fields is not None and 'status' not in update_fields:
+                self.succeeded_delta = 0
+            else:
+                self.succeeded_delta = self._move_succeeded(self.status)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.succeeded_delta = self._move_succeeded('failed')
+            return super().delete(*args, **kwargs)
 
     class Meta:
         indexes = [
@@ -61,4 +93,92 @@ class PaymentLog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.action} for {self.payment.order_tracking_id}"
\ No newline at end of file
+        return f"{self.action} for {self.payment.order_tracking_id}"
+
+class InstructorEarningsDaily(models.Model):
+    """Succeeded payments per instructor, day and currency (see ``payments.earnings``)."""
+    instructor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='earnings_daily')
+    day = models.DateField()
+    currency = models.CharField(max_length=3)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('instructor', 'day', 'currency')
+
+    def __str__(self):
+        return f"{self.instructor} {self.day} {self.amount} {self.currency}"
+
+
+class RevenueBucket(models.Model):
+    """Succeeded payments per day or month, currency and method (see ``payments.revenue``)."""
+    DAY = 'day'
+    MONTH = 'month'
+    PERIOD_CHOICES = [
+        (DAY, 'Day'),
+        (MONTH, 'Month'),
+    ]
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    start = models.DateField()
+    currency = models.CharField(max_length=3)
+    payment_method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHODS)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('period', 'start', 'currency', 'payment_method')
+
+    def __str__(self):
+        return f"{self.period} {self.start} {self.payment_method} {self.amount} {self.currency}"
+
+
+class PaymentJob(models.Model):
+    """Queued provider processing for a pending ``Payment`` (see ``payments.jobs``)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='job')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    # Provider input (phone/card number); cleared once the job finishes.
+    payload = models.JSONField(default=dict, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"Job {self.status} for {self.payment.order_tracking_id}"
+
+
+class IdempotencyKey(models.Model):
+    """A client idempotency key and the response it produced (see ``payments.idempotency``)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # Hash of the request body, to refuse a key reused for a different request.
+    fingerprint = models.CharField(max_length=64)
+    # Empty until the first request finishes; duplicates then replay it.
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.user} - {self.key}"
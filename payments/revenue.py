@@ -0,0 +1,109 @@
+"""Platform revenue time series.
+
+``RevenueBucket`` holds the total and count of succeeded payments per day and
+per month, currency and payment method. ``payments.signals`` applies each
+payment to its day and month buckets when its status becomes ``succeeded``
+(and takes it back if it leaves that status or is deleted), so ``series``
+reads one grouped row per bucket instead of scanning payments. Buckets with
+no revenue have no row; ``series`` fills them with zeros. ``rebuild``
+recomputes the table from the payments (``backfill_revenue_buckets``).
+"""
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import Payment, RevenueBucket
+
+BREAKDOWNS = ('currency', 'payment_method')
+
+
+def bucket_starts(day):
+    """Start date of each period containing ``day``."""
+    return {RevenueBucket.DAY: day, RevenueBucket.MONTH: day.replace(day=1)}
+
+
+def _add(key, amount, count):
+    if RevenueBucket.objects.filter(**key).update(
+        amount=F('amount') + amount, payments_count=F('payments_count') + count,
+    ):
+        return
+    try:
+        with transaction.atomic():
+            RevenueBucket.objects.create(**key, amount=amount, payments_count=count)
+    except IntegrityError:
+        # Another request created the row first.
+        RevenueBucket.objects.filter(**key).update(
+            amount=F('amount') + amount, payments_count=F('payments_count') + count,
+        )
+
+
+def apply(payment, sign):
+    """Add (``sign=1``) or remove (``sign=-1``) ``payment`` from its day and month buckets."""
+    starts = bucket_starts(timezone.localdate(payment.created_at))
+    for period, start in starts.items():
+        _add(
+            {'period': period, 'start': start, 'currency': payment.currency, 'payment_method': payment.payment_method},
+            payment.amount * sign, sign,
+        )
+
+
+def rebuild():
+    """Recompute every bucket from succeeded payments; returns the number of rows."""
+    tz = timezone.get_current_timezone()
+    truncs = {
+        RevenueBucket.DAY: TruncDate('created_at', tzinfo=tz),
+        RevenueBucket.MONTH: TruncMonth('created_at', output_field=DateField(), tzinfo=tz),
+    }
+    buckets = []
+    for period, trunc in truncs.items():
+        rows = (
+            Payment.objects.filter(status='succeeded')
+            .annotate(start=trunc)
+            .order_by()
+            .values('start', 'currency', 'payment_method')
+            .annotate(total=Sum('amount'), count=Count('pk'))
+        )
+        buckets.extend(
+            RevenueBucket(
+                period=period, start=row['start'], currency=row['currency'], payment_method=row['payment_method'],
+                amount=row['total'], payments_count=row['count'],
+            )
+            for row in rows
+        )
+    with transaction.atomic():
+        RevenueBucket.objects.all().delete()
+        RevenueBucket.objects.bulk_create(buckets, batch_size=1000)
+    return len(buckets)
+
+
+def _starts(period, count, last):
+    if period == RevenueBucket.DAY:
+        return [last - timedelta(days=offset) for offset in range(count - 1, -1, -1)]
+    months = last.year * 12 + last.month - 1
+    return [date(month // 12, month % 12 + 1, 1) for month in range(months - count + 1, months + 1)]
+
+
+def series(period=RevenueBucket.MONTH, count=12, breakdown=None, currency=None):
+    """The last ``count`` buckets of ``period``, up to the current one.
+
+    Returns ``(starts, totals)`` where ``totals`` maps each ``breakdown``
+    value (``None`` without a breakdown) to one amount per start, with zeros
+    for buckets that had no revenue.
+    """
+    starts = _starts(period, count, bucket_starts(timezone.localdate())[period])
+    buckets = RevenueBucket.objects.filter(period=period, start__gte=starts[0], start__lte=starts[-1])
+    if currency:
+        buckets = buckets.filter(currency=currency)
+    fields = ['start', breakdown] if breakdown else ['start']
+    amounts = {}
+    for row in buckets.order_by().values(*fields).annotate(total=Sum('amount')):
+        amounts.setdefault(row.get(breakdown), {})[row['start']] = row['total']
+    if not amounts and not breakdown:
+        amounts[None] = {}
+    return starts, {
+        name: [float(by_start.get(start, 0)) for start in starts]
+        for name, by_start in sorted(amounts.items(), key=lambda item: str(item[0]))
+    }
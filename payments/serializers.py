@@ -1,9 +1,41 @@
+from collections import defaultdict
+
 from rest_framework import serializers
 from .models import Payment
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
 
 User = get_user_model()
 
+def resolve_content_titles(payments):
+    """Set ``content_object_title`` on each payment with one query per content type.
+
+    Replaces a ``content_object`` lookup per row; missing objects get 'Unknown'.
+    """
+    object_ids = defaultdict(set)
+    for payment in payments:
+        object_ids[payment.content_type_id].add(payment.object_id)
+    titles = {}
+    for content_type_id, ids in object_ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+        objects = model._base_manager.filter(pk__in=ids)
+        if any(field.name == 'title' for field in model._meta.concrete_fields):
+            rows = objects.values_list('pk', 'title')
+        else:
+            rows = ((obj.pk, str(obj)) for obj in objects)
+        titles.update(((content_type_id, pk), title) for pk, title in rows)
+    for payment in payments:
+        payment.content_object_title = titles.get((payment.content_type_id, payment.object_id), 'Unknown')
+    return payments
+
+class PaymentListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        payments = list(data.all() if isinstance(data, models.Manager) else data)
+        return super().to_representation(resolve_content_titles(payments))
+
 class PaymentSerializer(serializers.ModelSerializer):
     content_object_title = serializers.SerializerMethodField()
     payment_method_display = serializers.CharField(source='get_payment_method_display')
@@ -16,9 +48,12 @@ class PaymentSerializer(serializers.ModelSerializer):
             'payment_method', 'payment_method_display', 'created_at'
         ]
         read_only_fields = ['id', 'user', 'order_tracking_id', 'created_at']
+        list_serializer_class = PaymentListSerializer
 
     def get_content_object_title(self, obj):
-        return obj.content_object.title if obj.content_object else 'Unknown'
+        if not hasattr(obj, 'content_object_title'):
+            resolve_content_titles([obj])
+        return obj.content_object_title
 
 class EarningsSerializer(serializers.Serializer):
     sales_this_month = serializers.DecimalField(max_digits=10, decimal_places=2)
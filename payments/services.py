@@ -0,0 +1,232 @@
+"""Payment checkout shared by the checkout endpoint and paid enrollment.
+
+``checkout`` runs the whole flow in the calling process: validate the input,
+create the ``Payment``, run the (simulated) provider charge, confirm it and
+queue the receipt in the email outbox in the same transaction as the status
+change. ``enqueue_checkout`` stops after creating the pending payment and
+leaves the charge to ``payments.jobs`` (``run_payment_worker``).
+
+Course enrollment and event registration go through ``pay``, which calls
+``checkout`` directly unless ``PAYMENTS_MODE=remote``, in which case it
+POSTs to ``PAYMENTS_API_BASE_URL`` through ``payments.client`` like a
+separate payments deployment would expect. Every path returns the same
+``{'order_tracking_id', 'status', 'details'}`` dict.
+
+A payment that succeeds enrolls the payer in the course (or registers them
+for the event) in the same transaction, whichever process runs the charge,
+so a queued charge that settles after the request has returned still grants
+access.
+"""
+import logging
+import re
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from rest_framework.exceptions import NotAuthenticated, ValidationError
+
+from notifications import outbox
+
+from . import client
+from .events import PaymentEventRecorder
+from .models import Payment, PaymentJob, PaymentLog
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_METHODS = [method for method, _ in Payment.PAYMENT_METHODS]
+
+# What a succeeded payment grants, per payable model: the access model and
+# its field pointing at the paid object.
+ACCESS_MODELS = {
+    'course.Course': ('course.Enrollment', 'course'),
+    'coaching.Event': ('coaching.Participant', 'event'),
+}
+
+
+def validate_payment_input(payment_method, phone_number, card_number):
+    if payment_method not in PAYMENT_METHODS:
+        raise ValidationError("Invalid payment method")
+    if payment_method == 'card' and not card_number:
+        raise ValidationError("Card number is required for card payments")
+    if payment_method != 'card' and not phone_number:
+        raise ValidationError("Phone number is required for mobile payments")
+    if phone_number and not re.match(r'^\+25[45]\d{9}$', phone_number):
+        raise ValidationError("Invalid phone number format. Use +254 or +255 followed by 9 digits.")
+    if card_number and not re.match(r'^\d{16}$', card_number):
+        raise ValidationError("Invalid card number format. Use 16 digits.")
+
+
+def handle_simulated_payment(payment, phone_number, card_number, events):
+    # The order tracking id is the provider idempotency key: a retried job
+    # replays the recorded provider answer instead of charging again.
+    processed = PaymentLog.objects.filter(payment=payment, action='processed').values_list('details', flat=True).first()
+    if processed and 'response' in processed:
+        return processed['response']
+    try:
+        response = {'status': 'success', 'message': f"Simulated {payment.payment_method} payment successful."}
+        events.record(payment, 'processed', {
+            'method': payment.payment_method,
+            'phone_number': phone_number,
+            'card_number': card_number,
+            'idempotency_key': payment.order_tracking_id,
+            'response': response,
+        })
+        return response
+    except Exception as e:
+        logger.error(f"Simulated payment error: {str(e)}")
+        events.record(payment, 'failed', {'error': str(e)})
+        raise ValidationError("Simulated payment failed.")
+
+
+def send_confirmation(payment):
+    if not settings.EMAIL_HOST_USER:
+        return
+    content_object = payment.content_object
+    outbox.enqueue_mail(
+        subject=f"Payment Confirmation: {content_object.title}",
+        message=(
+            f"Dear {payment.user.full_name},\n\n"
+            f"Your payment of {payment.amount} {payment.currency} for '{content_object.title}' was successful.\n"
+            f"Order ID: {payment.order_tracking_id}\n"
+            f"Method: {payment.get_payment_method_display()}\n\n"
+            f"Thank you!\nThe Team"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[payment.user.email],
+    )
+
+
+def grant_access(payment):
+    """Enroll or register the payer of a succeeded ``payment``; returns the row, if any.
+
+    Nothing is granted when the amount paid is below the object's current
+    price (checkout takes the amount from the client).
+    """
+    paid_model = payment.content_type.model_class()
+    if paid_model is None or paid_model._meta.label not in ACCESS_MODELS:
+        return None
+    access_label, field = ACCESS_MODELS[paid_model._meta.label]
+    price = paid_model.objects.filter(pk=payment.object_id).values_list('final_price', flat=True).first()
+    if price is None or payment.amount < price:
+        logger.warning("Payment %s does not cover %s %s", payment.order_tracking_id, paid_model._meta.label, payment.object_id)
+        return None
+    access, _ = apps.get_model(access_label).objects.get_or_create(
+        user_id=payment.user_id, **{f'{field}_id': payment.object_id},
+    )
+    return access
+
+
+def _result(payment, details):
+    return {'order_tracking_id': payment.order_tracking_id, 'status': payment.status, 'details': details}
+
+
+def create_payment(user, content_object, amount, payment_method='mpesa'):
+    """The new pending ``Payment``."""
+    return Payment.objects.create(
+        user=user,
+        content_type=ContentType.objects.get_for_model(content_object),
+        object_id=content_object.pk,
+        order_tracking_id=str(uuid.uuid4()),
+        amount=amount,
+        currency=settings.DEFAULT_CURRENCY,
+        status='pending',
+        payment_method=payment_method
+    )
+
+
+def _claim_pending(payment):
+    # A no-op UPDATE that holds the row (the write lock on SQLite, where
+    # SELECT ... FOR UPDATE does nothing) until the transaction ends, and
+    # re-checks the status once it has it: of two workers running the same
+    # payment (a job requeued while still running), only the first charges.
+    return Payment.objects.filter(pk=payment.pk, status='pending').update(status='pending')
+
+
+def process_payment(payment, phone_number=None, card_number=None):
+    """Run the provider charge for a pending ``payment``; returns the provider message.
+
+    The status change, the enrollment or registration it pays for, its log
+    entries (one ``bulk_create``) and the receipt commit together. Nothing is
+    charged if the stored payment is no longer pending.
+    """
+    with PaymentEventRecorder() as events, transaction.atomic():
+        if not _claim_pending(payment):
+            payment.status = Payment.objects.filter(pk=payment.pk).values_list('status', flat=True).get()
+            return "Payment already processed."
+        sim_result = handle_simulated_payment(payment, phone_number, card_number, events)
+        if sim_result['status'] == 'success':
+            payment.status = 'succeeded'
+            payment.save(update_fields=['status'])
+            events.record(payment, 'confirmed', {'simulated_response': sim_result})
+            grant_access(payment)
+            send_confirmation(payment)
+    return sim_result['message']
+
+
+def checkout(user, content_object, amount, payment_method='mpesa', phone_number=None, card_number=None):
+    """Charge ``user`` for ``content_object`` in this process.
+
+    Raises ``ValidationError`` for invalid input. Duplicate requests are
+    handled before this by ``payments.idempotency``.
+    """
+    validate_payment_input(payment_method, phone_number, card_number)
+    payment = create_payment(user, content_object, amount, payment_method)
+    return _result(payment, process_payment(payment, phone_number, card_number))
+
+
+def enqueue_checkout(user, content_object, amount, payment_method='mpesa', phone_number=None, card_number=None):
+    """Create the pending payment and queue its processing for ``run_payment_worker``."""
+    validate_payment_input(payment_method, phone_number, card_number)
+    with transaction.atomic():
+        payment = create_payment(user, content_object, amount, payment_method)
+        PaymentJob.objects.create(payment=payment, payload={'phone_number': phone_number, 'card_number': card_number})
+    return _result(payment, "Payment queued.")
+
+
+def remote_checkout(auth_token, content_object, amount, payment_method, phone_number, card_number):
+    """POST the checkout to ``PAYMENTS_API_BASE_URL`` through ``payments.client``.
+
+    One idempotency key covers all retries, so a retry after a lost response
+    cannot charge twice. A checkout the service queued is long-polled once on
+    its status endpoint, for at most ``PAYMENTS_STATUS_MAX_WAIT`` seconds; if
+    it has not settled by then the result stays ``pending`` and the service
+    grants access when the charge succeeds. A rejection by the remote service
+    is re-raised as ``ValidationError`` carrying its detail.
+    """
+    payload = {
+        'content_type_id': ContentType.objects.get_for_model(content_object).id,
+        'object_id': content_object.pk,
+        'amount': float(amount),
+        'payment_method': payment_method,
+        'phone_number': phone_number,
+        'card_number': card_number,
+        'idempotency_key': str(uuid.uuid4()),
+    }
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    try:
+        result = client.post_json('/checkout/', payload, headers=headers)
+        if result.get('status') == 'pending' and settings.PAYMENTS_STATUS_MAX_WAIT > 0:
+            wait = settings.PAYMENTS_STATUS_MAX_WAIT
+            result = client.get_json(
+                f"/status/{result['order_tracking_id']}/",
+                params={'wait': wait}, headers=headers, deadline=wait + settings.PAYMENTS_CONNECT_TIMEOUT,
+            )
+        return result
+    except client.PaymentRejected as e:
+        try:
+            detail = e.response.json().get('detail')
+        except ValueError:
+            detail = None
+        raise ValidationError(detail or "Payment was rejected.")
+
+
+def pay(user, content_object, amount, payment_method='mpesa', phone_number=None, card_number=None,
+        auth_token=None):
+    """Checkout for paid enrollment/registration, in-process unless ``PAYMENTS_MODE=remote``."""
+    if settings.PAYMENTS_MODE == 'remote':
+        if not auth_token:
+            raise NotAuthenticated('Authentication required for paid checkout.')
+        return remote_checkout(auth_token, content_object, amount, payment_method, phone_number, card_number)
+    return checkout(user, content_object, amount, payment_method, phone_number, card_number)
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import earnings, revenue
+from .models import Payment
+
+
+def _apply(payment, sign):
+    earnings.apply(payment, sign)
+    revenue.apply(payment, sign)
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, raw=False, **kwargs):
+    # ``succeeded_delta`` comes from the conditional UPDATE in Payment.save,
+    # inside the same transaction, so a rollback undoes both.
+    if not raw and instance.succeeded_delta:
+        _apply(instance, instance.succeeded_delta)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    # Payments deleted through a cascade never went through ``delete``; their
+    # status was just read by the collector.
+    delta = instance.succeeded_delta
+    if delta is None:
+        delta = -int(instance.status == 'succeeded')
+    if delta:
+        _apply(instance, delta)
@@ -1,3 +1,249 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.response import Response
+
+from course.models import Course, Enrollment
+
+from . import client, earnings, idempotency, jobs, services
+from .models import IdempotencyKey, Payment, PaymentJob, PaymentLog, RevenueBucket
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Each test sets ``server.replies``: a list of (status, body, delay) tuples
+    # answered in order; the last one repeats.
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.calls += 1
+        replies = self.server.replies
+        status, body, delay = replies.pop(0) if len(replies) > 1 else replies[0]
+        time.sleep(delay)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class PaymentClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.overrides = override_settings(
+            PAYMENTS_API_BASE_URL=f'http://127.0.0.1:{cls.server.server_port}',
+            PAYMENTS_REQUEST_DEADLINE=2,
+            PAYMENTS_MAX_ATTEMPTS=3,
+            PAYMENTS_BACKOFF_BASE=0.01,
+            PAYMENTS_BACKOFF_MAX=0.02,
+            PAYMENTS_BREAKER_THRESHOLD=2,
+            PAYMENTS_BREAKER_RESET=60,
+        )
+        cls.overrides.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.overrides.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.server.calls = 0
+
+    def test_retries_server_errors_then_succeeds(self):
+        self.server.replies = [(503, {}, 0), (200, {'status': 'succeeded'}, 0)]
+        self.assertEqual(client.post_json('/checkout/', {}), {'status': 'succeeded'})
+        self.assertEqual(self.server.calls, 2)
+
+    def test_rejection_is_not_retried(self):
+        self.server.replies = [(400, {'detail': 'Invalid payment method'}, 0)]
+        with self.assertRaises(client.PaymentRejected) as raised:
+            client.post_json('/checkout/', {})
+        self.assertEqual(raised.exception.response.json(), {'detail': 'Invalid payment method'})
+        self.assertEqual(self.server.calls, 1)
+        self.assertFalse(client.breaker.is_open())
+
+    def test_deadline_bounds_slow_provider(self):
+        self.server.replies = [(200, {}, 1)]
+        started = time.monotonic()
+        with self.assertRaises(requests.RequestException):
+            client.post_json('/checkout/', {}, deadline=0.3)
+        self.assertLess(time.monotonic() - started, 0.9)
+
+    def test_breaker_opens_and_fails_fast(self):
+        self.server.replies = [(503, {}, 0)]
+        for _ in range(2):
+            with self.assertRaises(requests.RequestException):
+                client.post_json('/checkout/', {})
+        calls = self.server.calls
+        with self.assertRaises(client.CircuitOpen):
+            client.post_json('/checkout/', {})
+        self.assertEqual(self.server.calls, calls)
+
+
+class PaymentJobTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.instructor = User.objects.create_user(email='instructor@example.com', password='testpass123')
+        self.learner = User.objects.create_user(email='learner@example.com', password='testpass123')
+        self.course = Course.objects.create(title='Course', instructor=self.instructor, final_price=100)
+
+    def checkout(self, amount):
+        result = services.enqueue_checkout(self.learner, self.course, amount, phone_number='+254700000000')
+        self.assertEqual(result['status'], 'pending')
+        self.assertEqual(jobs.run_pending(), 1)
+        return Payment.objects.get(order_tracking_id=result['order_tracking_id'])
+
+    def earnings(self):
+        return earnings.totals(self.instructor)
+
+    def test_queued_payment_enrolls_when_it_succeeds(self):
+        self.assertFalse(Enrollment.objects.filter(user=self.learner, course=self.course).exists())
+        payment = self.checkout(100)
+        self.assertEqual(payment.status, 'succeeded')
+        self.assertTrue(Enrollment.objects.filter(user=self.learner, course=self.course).exists())
+
+    def test_underpayment_does_not_enroll(self):
+        payment = self.checkout(1)
+        self.assertEqual(payment.status, 'succeeded')
+        self.assertFalse(Enrollment.objects.filter(user=self.learner, course=self.course).exists())
+
+    def test_failed_confirmation_logs_no_confirmed_entry(self):
+        with override_settings(PAYMENTS_JOB_MAX_ATTEMPTS=1), \
+                mock.patch.object(services, 'send_confirmation', side_effect=RuntimeError('smtp down')), \
+                self.captureOnCommitCallbacks(execute=True):
+            payment = self.checkout(100)
+        self.assertEqual(payment.status, 'failed')
+        actions = list(PaymentLog.objects.filter(payment=payment).order_by('pk').values_list('action', flat=True))
+        self.assertEqual(actions, ['processed', 'failed'])
+
+    def test_failed_final_attempt_keeps_rollup(self):
+        self.checkout(100)
+        with override_settings(PAYMENTS_JOB_MAX_ATTEMPTS=1), \
+                mock.patch.object(services, 'send_confirmation', side_effect=RuntimeError('smtp down')):
+            self.assertEqual(self.checkout(100).status, 'failed')
+        self.assertEqual(self.earnings(), {'month': 100, 'lifetime': 100, 'payments': 1})
+
+    def test_stale_instances_count_once(self):
+        payment = services.create_payment(self.learner, self.course, 100)
+        first, stale = Payment.objects.get(pk=payment.pk), Payment.objects.get(pk=payment.pk)
+        first.status = 'succeeded'
+        first.save(update_fields=['status'])
+        stale.status = 'succeeded'
+        stale.save(update_fields=['status'])
+        self.assertEqual(self.earnings()['payments'], 1)
+
+        stale.status = 'failed'
+        stale.save(update_fields=['status'])
+        first.delete()
+        self.assertEqual(self.earnings(), {'month': 0, 'lifetime': 0, 'payments': 0})
+
+
+    def test_stale_payment_is_charged_once(self):
+        payment = services.create_payment(self.learner, self.course, 100)
+        stale = Payment.objects.get(pk=payment.pk)
+        services.process_payment(payment, phone_number='+254700000000')
+        with mock.patch.object(services, 'handle_simulated_payment') as charge:
+            services.process_payment(stale, phone_number='+254700000000')
+        charge.assert_not_called()
+        self.assertEqual(stale.status, 'succeeded')
+        self.assertEqual(self.earnings()['payments'], 1)
+
+    def revenue(self):
+        return list(RevenueBucket.objects.order_by('period').values_list('period', 'amount', 'payments_count'))
+
+    def test_revenue_after_retried_and_failed_jobs(self):
+        with mock.patch.object(services, 'send_confirmation', side_effect=[RuntimeError('smtp down'), None]):
+            payment = self.checkout(100)
+            self.assertEqual(payment.status, 'pending')
+            PaymentJob.objects.filter(payment=payment).update(run_after=timezone.now())
+            self.assertEqual(jobs.run_pending(), 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'succeeded')
+        counted = [(RevenueBucket.DAY, 100, 1), (RevenueBucket.MONTH, 100, 1)]
+        self.assertEqual(self.revenue(), counted)
+
+        with override_settings(PAYMENTS_JOB_MAX_ATTEMPTS=1), \
+                mock.patch.object(services, 'send_confirmation', side_effect=RuntimeError('smtp down')):
+            self.assertEqual(self.checkout(100).status, 'failed')
+        self.assertEqual(self.revenue(), counted)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='learner@example.com', password='testpass123')
+        self.fingerprint = idempotency.fingerprint({'amount': 100, 'idempotency_key': 'k1'})
+
+    def test_fingerprint_ignores_key(self):
+        self.assertEqual(self.fingerprint, idempotency.fingerprint({'amount': 100, 'idempotency_key': 'k2'}))
+        self.assertNotEqual(self.fingerprint, idempotency.fingerprint({'amount': 200}))
+
+    def test_duplicate_replays_completed_response(self):
+        record, reserved = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        self.assertTrue(reserved)
+        duplicate, reserved = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        self.assertFalse(reserved)
+        self.assertEqual(idempotency.replay(duplicate, self.fingerprint).status_code, 409)
+
+        idempotency.complete(record, Response({'status': 'succeeded'}, status=200))
+        duplicate, _ = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        response = idempotency.replay(duplicate, self.fingerprint)
+        self.assertEqual((response.status_code, response.data), (200, {'status': 'succeeded'}))
+        self.assertEqual(idempotency.replay(duplicate, 'other').status_code, 422)
+
+    def test_server_error_releases_key(self):
+        record, _ = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        idempotency.complete(record, Response({'detail': 'error'}, status=500))
+        self.assertFalse(IdempotencyKey.objects.exists())
+        _, reserved = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        self.assertTrue(reserved)
+
+    def test_abandoned_key_is_taken_over(self):
+        abandoned, _ = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        IdempotencyKey.objects.filter(pk=abandoned.pk).update(created_at=timezone.now() - timedelta(seconds=600))
+        abandoned.refresh_from_db()
+
+        _, reserved = idempotency.reserve(self.user, 'k1', 'other')
+        self.assertFalse(reserved)
+        record, reserved = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        self.assertTrue(reserved)
+        _, reserved = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        self.assertFalse(reserved)
+
+        # The request that lost its lease cannot overwrite or drop the key.
+        idempotency.complete(abandoned, Response({'status': 'stale'}, status=200))
+        idempotency.release(abandoned)
+        idempotency.complete(record, Response({'status': 'succeeded'}, status=200))
+        self.assertEqual(IdempotencyKey.objects.get().response_body, {'status': 'succeeded'})
+
+    def test_key_released_during_reserve(self):
+        holder, _ = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        get = IdempotencyKey.objects.get
+        holders = [holder]
+
+        def get_after_release(**kwargs):
+            # The holder releases the key between our failed INSERT and this read.
+            if holders:
+                idempotency.release(holders.pop())
+            return get(**kwargs)
+
+        with mock.patch.object(IdempotencyKey.objects, 'get', side_effect=get_after_release):
+            record, reserved = idempotency.reserve(self.user, 'k1', self.fingerprint)
+        self.assertTrue(reserved)
+        self.assertEqual(IdempotencyKey.objects.get().pk, record.pk)
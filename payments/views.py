@@ -4,19 +4,16 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import ValidationError
 from rest_framework.throttling import UserRateThrottle
-from django.contrib.contenttypes.models import ContentType
-from django.core.mail import send_mail
 from django.conf import settings
-from django.utils import timezone
-from django.db.models import Sum, Q
 from django.contrib.contenttypes.models import ContentType
-import re
-import uuid
+from django.db.models import Q
+from decimal import Decimal
 import logging
 
 from course.models import Course
 from coaching.models import Event
-from .models import Payment, PaymentLog
+from . import earnings as earnings_rollup, idempotency, jobs, services
+from .models import Payment
 from .serializers import PaymentSerializer, EarningsSerializer
 
 logger = logging.getLogger(__name__)
@@ -28,107 +25,43 @@ class PaymentViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     throttle_classes = [PaymentThrottle]
 
-    def validate_payment_input(self, payment_method, phone_number, card_number):
-        if payment_method not in ['mpesa', 'vodacom', 'airtel', 'mtn', 'card']:
-            raise ValidationError("Invalid payment method")
-        if payment_method == 'card' and not card_number:
-            raise ValidationError("Card number is required for card payments")
-        if payment_method != 'card' and not phone_number:
-            raise ValidationError("Phone number is required for mobile payments")
-        if phone_number and not re.match(r'^\+25[45]\d{9}$', phone_number):
-            raise ValidationError("Invalid phone number format. Use +254 or +255 followed by 9 digits.")
-        if card_number and not re.match(r'^\d{16}$', card_number):
-            raise ValidationError("Invalid card number format. Use 16 digits.")
-
-    def handle_simulated_payment(self, payment, phone_number, card_number):
-        try:
-            PaymentLog.objects.create(
-                payment=payment,
-                action='processed',
-                details={
-                    'method': payment.payment_method,
-                    'phone_number': phone_number,
-                    'card_number': card_number
-                }
-            )
-            return {'status': 'success', 'message': f"Simulated {payment.payment_method} payment successful."}
-        except Exception as e:
-            logger.error(f"Simulated payment error: {str(e)}")
-            PaymentLog.objects.create(
-                payment=payment,
-                action='failed',
-                details={'error': str(e)}
-            )
-            raise ValidationError("Simulated payment failed.")
-
     @action(detail=False, methods=['post'], url_path='checkout')
     def checkout(self, request):
+        idempotency_key = request.data.get('idempotency_key')
+        if not idempotency_key:
+            return self.process_checkout(request)
+        request_fingerprint = idempotency.fingerprint(request.data)
+        record, reserved = idempotency.reserve(request.user, str(idempotency_key), request_fingerprint)
+        if not reserved:
+            return idempotency.replay(record, request_fingerprint)
+        try:
+            response = self.process_checkout(request)
+        except Exception:
+            idempotency.release(record)
+            raise
+        idempotency.complete(record, response)
+        return response
+
+    def process_checkout(self, request):
         content_type_id = request.data.get('content_type_id')
         object_id = request.data.get('object_id')
         amount = request.data.get('amount')
         payment_method = request.data.get('payment_method', 'mpesa')
         phone_number = request.data.get('phone_number')
         card_number = request.data.get('card_number')
-        idempotency_key = request.data.get('idempotency_key')
 
         try:
             content_type = ContentType.objects.get(id=content_type_id)
             content_object = content_type.get_object_for_this_type(id=object_id)
-            self.validate_payment_input(payment_method, phone_number, card_number)
-
-            if idempotency_key and Payment.objects.filter(order_tracking_id=idempotency_key).exists():
-                payment = Payment.objects.get(order_tracking_id=idempotency_key)
-                serializer = PaymentSerializer(payment)
-                return Response({
-                    'order_tracking_id': payment.order_tracking_id,
-                    'status': payment.status,
-                    'details': f"Payment already {payment.status}."
-                }, status=status.HTTP_200_OK)
-
-            payment = Payment.objects.create(
-                user=request.user,
-                content_type=content_type,
-                object_id=object_id,
-                order_tracking_id=idempotency_key or str(uuid.uuid4()),
-                amount=amount,
-                currency=settings.DEFAULT_CURRENCY,
-                status='pending',
-                payment_method=payment_method
+            checkout = services.enqueue_checkout if settings.PAYMENTS_ASYNC_CHECKOUT else services.checkout
+            result = checkout(
+                request.user, content_object, amount,
+                payment_method=payment_method,
+                phone_number=phone_number,
+                card_number=card_number,
             )
-
-            sim_result = self.handle_simulated_payment(payment, phone_number, card_number)
-            if sim_result['status'] == 'success':
-                payment.status = 'succeeded'
-                payment.save()
-                PaymentLog.objects.create(
-                    payment=payment,
-                    action='confirmed',
-                    details={'simulated_response': sim_result}
-                )
-
-                subject = f"Payment Confirmation: {content_object.title}"
-                message = (
-                    f"Dear {payment.user.full_name},\n\n"
-                    f"Your payment of {payment.amount} {payment.currency} for '{content_object.title}' was successful.\n"
-                    f"Order ID: {payment.order_tracking_id}\n"
-                    f"Method: {payment.get_payment_method_display()}\n\n"
-                    f"Thank you!\nThe Team"
-                )
-                if settings.EMAIL_HOST_USER:
-                    send_mail(
-                        subject=subject,
-                        message=message,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[payment.user.email],
-                        fail_silently=True,
-                    )
-
-            serializer = PaymentSerializer(payment)
-            return Response({
-                'order_tracking_id': payment.order_tracking_id,
-                'status': payment.status,
-                'details': sim_result['message']
-            }, status=status.HTTP_200_OK)
+            response_status = status.HTTP_202_ACCEPTED if result['status'] == 'pending' else status.HTTP_200_OK
+            return Response(result, status=response_status)
         except ContentType.DoesNotExist:
             return Response({'detail': 'Invalid content type'}, status=status.HTTP_400_BAD_REQUEST)
         except ValidationError as e:
@@ -137,6 +70,24 @@ class PaymentViewSet(viewsets.ViewSet):
             logger.exception("Checkout error")
             return Response({'detail': 'Error processing payment.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(
+        detail=False, methods=['get'], url_path=r'status/(?P<order_tracking_id>[^/]+)',
+        throttle_classes=[UserRateThrottle],
+    )
+    def payment_status(self, request, order_tracking_id=None):
+        try:
+            wait = max(0.0, float(request.query_params.get('wait', 0)))
+        except ValueError:
+            return Response({'detail': 'wait must be a number of seconds'}, status=status.HTTP_400_BAD_REQUEST)
+        current = jobs.payment_status(request.user, order_tracking_id, wait)
+        if current is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'order_tracking_id': order_tracking_id,
+            'status': current,
+            'details': f"Payment {current}.",
+        })
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def earnings(self, request):
         try:
@@ -155,24 +106,19 @@ class PaymentViewSet(viewsets.ViewSet):
             ).filter(
                 Q(content_type=course_ct, object_id__in=owned_course_ids)
                 | Q(content_type=event_ct, object_id__in=owned_event_ids)
-            ).select_related('content_type', 'user').order_by('-created_at')
+            ).order_by('-created_at')
 
-            total_payments = payments.count()
-            total_pages = (total_payments + page_size - 1) // page_size
+            # Totals and the payment count come from the daily rollup.
+            totals = earnings_rollup.totals(request.user)
+            total_pages = (totals['payments'] + page_size - 1) // page_size
             start = (page - 1) * page_size
             end = start + page_size
             paginated_payments = payments[start:end]
 
-            now = timezone.now()
-            month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            sales_this_month = payments.filter(created_at__gte=month_start).aggregate(Sum('amount'))['amount__sum'] or 0
-            lifetime_earnings = payments.aggregate(Sum('amount'))['amount__sum'] or 0
-            to_be_paid = lifetime_earnings * 0.75  # Simplified: 75% after commission
-
             serializer = EarningsSerializer({
-                'sales_this_month': sales_this_month,
-                'to_be_paid': to_be_paid,
-                'lifetime_earnings': lifetime_earnings,
+                'sales_this_month': totals['month'],
+                'to_be_paid': totals['lifetime'] * Decimal('0.75'),  # Simplified: 75% after commission
+                'lifetime_earnings': totals['lifetime'],
                 'payments': paginated_payments,
                 'total_pages': total_pages,
                 'current_page': page